@@ -0,0 +1,121 @@
+'''
+benchmark용 페이지를 loopback(127.0.0.1)에서 내주는 HTTP 서버.
+네트워크 상태에 따라 결과가 흔들리지 않도록, 실제 사이트 대신 만들어 낸 페이지와 저장해둔 페이지를 여기서 받아온다.
+
+- /synthetic/<이름>.html: synthetic_pages()가 만든 페이지. stylesheet는 /synthetic/css/<번호>.css
+- /recorded/<경로>: recorded_dir에 저장해둔 파일을 그대로 내준다.
+
+HTTP/1.1에 Content-Length를 붙여 보내므로 keep-alive로 connection을 재사용할 수 있다.
+'''
+import os
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from benchmarks.html_parse import text_heavy_html
+
+CONTENT_TYPES = {".html": "text/html", ".htm": "text/html", ".css": "text/css"}
+
+def deep_nesting_html(depth=400, count=20):
+    block = "<div>" * depth + "<p>deep <b>text</b> here</p>" + "</div>" * depth + "\n"
+    return "<!doctype html><html><head><title>bench</title></head><body>" + block * count + "</body></html>"
+
+def many_stylesheets_html(count=40, paragraphs=500):
+    links = "".join('<link rel="stylesheet" href="/synthetic/css/{}.css">'.format(i) for i in range(count))
+    paragraph = "<div><p>Lorem ipsum <b>dolor</b> sit <i>amet</i>, consectetur adipiscing elit.</p></div>\n"
+    return "<!doctype html><html><head><title>bench</title>" + links + "</head><body>" \
+        + paragraph * paragraphs + "</body></html>"
+
+def stylesheet_css(number, rules=50):
+    tags = ["p", "div", "b", "i", "span", "li", "a", "h1"]
+    return "\n".join("{} {} {{ color: #{:06x}; font-size: {}%; }}".format(
+        tags[(number + i) % len(tags)], tags[i % len(tags)], (number * 7919 + i) % 0xffffff, 90 + i % 30)
+        for i in range(rules))
+
+def many_inline_styles_html(count=5000):
+    paragraph = '<p style="color: #{:06x}; font-size: {}%">inline <span style="font-weight: bold">styled</span> text</p>\n'
+    return "<!doctype html><html><head><title>bench</title></head><body>" \
+        + "".join(paragraph.format(i * 2654435761 % 0xffffff, 80 + i % 50) for i in range(count)) \
+        + "</body></html>"
+
+def synthetic_pages(scale=1):
+    '''
+    path -> body. scale로 페이지 크기를 조절한다.
+    '''
+    pages = {
+        "/synthetic/deep-nesting.html": deep_nesting_html(count=int(20 * scale)),
+        "/synthetic/huge-text.html": text_heavy_html(2 * scale),
+        "/synthetic/many-stylesheets.html": many_stylesheets_html(paragraphs=int(500 * scale)),
+        "/synthetic/many-inline-styles.html": many_inline_styles_html(int(5000 * scale)),
+    }
+    for i in range(40):
+        pages["/synthetic/css/{}.css".format(i)] = stylesheet_css(i)
+    return pages
+
+class FixtureServer:
+    def __init__(self, pages, recorded_dir=None):
+        self.pages = {path: body.encode("utf8") for path, body in pages.items()}
+        self.recorded_dir = recorded_dir
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address
+        return "http://{}:{}".format(host, port)
+
+    def recorded_pages(self):
+        # recorded_dir 아래의 html 파일들의 path
+        if not self.recorded_dir: return []
+        paths = []
+        for directory, _, names in os.walk(self.recorded_dir):
+            for name in sorted(names):
+                if os.path.splitext(name)[1] in (".html", ".htm"):
+                    relative = os.path.relpath(os.path.join(directory, name), self.recorded_dir)
+                    paths.append("/recorded/" + relative.replace(os.sep, "/"))
+        return sorted(paths)
+
+    def lookup(self, path):
+        if path in self.pages:
+            return self.pages[path]
+        if self.recorded_dir and path.startswith("/recorded/"):
+            root = os.path.realpath(self.recorded_dir)
+            filename = os.path.realpath(os.path.join(root, path[len("/recorded/"):]))
+            if filename.startswith(root + os.sep) and os.path.isfile(filename):
+                with open(filename, "rb") as f:
+                    return f.read()
+        return None
+
+    def handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True # header와 body를 따로 쓰므로, 켜두면 keep-alive 요청마다 delayed ACK만큼 기다린다.
+
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                body = server.lookup(path)
+                status = 200 if body is not None else 404
+                body = body if body is not None else b"not found"
+                content_type = CONTENT_TYPES.get(os.path.splitext(path)[1], "text/plain")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type + "; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Cache-Control", "no-store")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
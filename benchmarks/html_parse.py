@@ -0,0 +1,73 @@
+'''
+HTMLParser의 처리량(MB/s)을 이전의 한 글자씩 읽던 tokenizer(deprecated/http_parse.py)와 비교한다.
+tokenize는 DOM tree를 만들지 않고 token을 잘라내는 데까지만, parse는 tree까지 만드는 전체 시간이다.
+
+python3 -m benchmarks.html_parse [문서 크기(MB)] [반복 횟수]
+'''
+import sys
+import time
+
+from parse.http_parse import HTMLParser, Text
+from deprecated.http_parse import CharHTMLParser
+
+def markup_heavy_html(size_mb):
+    paragraph = ('<div class=section><p>Lorem ipsum dolor sit amet, <b>consectetur</b> adipiscing elit, '
+                 'sed do <i>eiusmod</i> tempor incididunt ut <a href="/x.html" title="a link">labore</a> et dolore.</p>'
+                 '<ul><li>one</li><li>two</li></ul></div>\n')
+    return wrap(paragraph, size_mb)
+
+def text_heavy_html(size_mb):
+    paragraph = "<p>" + "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 40 + "</p>\n"
+    return wrap(paragraph, size_mb)
+
+def wrap(paragraph, size_mb):
+    count = int(size_mb * 1024 * 1024 / len(paragraph)) + 1
+    return "<!doctype html><html><head><title>bench</title></head><body>" \
+        + paragraph * count + "</body></html>"
+
+def signature(root):
+    out = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Text):
+            out.append(("text", node.text))
+        else:
+            out.append((node.tag, tuple(sorted(node.attributes.items())), len(node.children)))
+        stack.extend(reversed(node.children))
+    return out
+
+def tokenize_only(parser_class):
+    class Tokenizer(parser_class):
+        def add_text(self, text): pass
+        def add_tag(self, tag): pass
+        def finish(self): pass
+    return Tokenizer
+
+def measure(parser_class, body, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tree = parser_class(body).parse()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, tree
+
+def main(size_mb=4, repeat=3):
+    for name, body in [("markup-heavy", markup_heavy_html(size_mb)), ("text-heavy", text_heavy_html(size_mb))]:
+        mb = len(body.encode("utf8")) / (1024 * 1024)
+        old_tokenize, _ = measure(tokenize_only(CharHTMLParser), body, repeat)
+        new_tokenize, _ = measure(tokenize_only(HTMLParser), body, repeat)
+        old_parse, old_tree = measure(CharHTMLParser, body, repeat)
+        new_parse, new_tree = measure(HTMLParser, body, repeat)
+        # 이전 tokenizer는 따옴표 안의 공백에서 attribute를 잘못 자르므로 tree 비교에서는 attribute를 빼고 본다.
+        strip = lambda sig: [item[:1] + item[2:] if item[0] != "text" else item for item in sig]
+        assert strip(signature(old_tree)) == strip(signature(new_tree)), "parsers built different trees"
+        print("{} ({:.2f} MB)".format(name, mb))
+        print("  tokenize  char-by-char {:8.2f} MB/s  bulk scan {:8.2f} MB/s  speedup {:.2f}x".format(
+            mb / old_tokenize, mb / new_tokenize, old_tokenize / new_tokenize))
+        print("  parse     char-by-char {:8.2f} MB/s  bulk scan {:8.2f} MB/s  speedup {:.2f}x".format(
+            mb / old_parse, mb / new_parse, old_parse / new_parse))
+
+if __name__ == "__main__":
+    main(*[float(arg) for arg in sys.argv[1:2]], *[int(arg) for arg in sys.argv[2:3]])
@@ -0,0 +1,54 @@
+'''
+긴 문서의 DocumentLayout.layout을 한 process에서 할 때와 layout_pool()로 줄바꿈을 나눠 할 때를 비교한다.
+Tk 없이 돌도록 TableMetrics backend를 쓴다.
+
+두 방식 모두 한 번씩 재지 않고 돌린 뒤(font, 단어 폭 cache와 worker를 데워둔 뒤) repeat번 재서 가장 빠른 값을 쓴다.
+결과가 같은지는 문서 높이뿐 아니라 paint한 display list 전체를 비교한다.
+layout_parallel은 layout tree 순회와 run을 보내고 결과를 받는 일을 이 process에서 하므로,
+core가 하나뿐인 곳에서는 parallel이 serial보다 느린 것이 정상이다. speedup은 core가 여럿인 곳에서 잰다.
+
+python3 -m benchmarks.layout [문서 크기(MB)] [worker 수] [반복 횟수]
+'''
+import os
+import sys
+import time
+
+from browser import DocumentLayout, style, layout_pool
+from parse.http_parse import HTMLParser
+from utils.display_list import DisplayList
+from utils.font_metrics import use_backend, TableMetrics
+from benchmarks.html_parse import text_heavy_html
+
+def measure(nodes, executor, repeat):
+    document = DocumentLayout(nodes)
+    document.layout(executor) # 데우기용. 재지 않는다.
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        document = DocumentLayout(nodes)
+        document.layout(executor)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, document
+
+def painted(document):
+    display_list = DisplayList()
+    document.paint(display_list)
+    return [(type(cmd).__name__, cmd.left, cmd.top, cmd.bottom, getattr(cmd, "text", None),
+             getattr(getattr(cmd, "font", None), "key", None), cmd.color) for cmd in display_list]
+
+def main(size_mb=4, workers=None, repeat=3):
+    use_backend(TableMetrics())
+    nodes = HTMLParser(text_heavy_html(size_mb)).parse()
+    style(nodes, [])
+    serial_time, serial = measure(nodes, None, repeat)
+    with layout_pool(workers) as executor:
+        parallel_time, parallel = measure(nodes, executor, repeat)
+    assert serial.height == parallel.height
+    assert painted(serial) == painted(parallel), "parallel layout differs from serial layout"
+    print("workers   {} (cpu count {})".format(workers or os.cpu_count(), os.cpu_count()))
+    print("serial    {:.3f}s".format(serial_time))
+    print("parallel  {:.3f}s ({:.2f}x)".format(parallel_time, serial_time / parallel_time))
+
+if __name__ == "__main__":
+    main(*[float(arg) for arg in sys.argv[1:2]], *[int(arg) for arg in sys.argv[2:4]])
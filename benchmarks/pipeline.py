@@ -0,0 +1,192 @@
+'''
+Browser.load의 단계별 시간을 잰다: request, parse(HTMLParser.parse), css(stylesheet 파싱), style, layout(DocumentLayout.layout), paint, draw.
+페이지는 benchmarks/fixture_server.py가 loopback에서 내주는 synthetic 페이지(와 --recorded로 넘긴 디렉토리의 저장된 페이지)를 쓴다.
+
+결과는 json으로 쓰고, --baseline을 주면 단계별로 비교해서 threshold보다 느려진 단계가 있으면 exit code 1로 끝난다.
+
+python3 -m benchmarks.pipeline [--scale 1] [--repeat 3] [--output pipeline.json] [--baseline baseline.json]
+                               [--save-baseline baseline.json] [--threshold 0.2] [--min-delta 0.005] [--recorded DIR]
+
+layout은 Tk 없이 돌도록 TableMetrics backend를 쓴다. draw는 Tk를 띄울 수 있으면 실제 canvas에, 아니면 NullCanvas에 한다.
+'''
+import argparse
+import json
+import platform
+import sys
+import time
+
+from browser import DocumentLayout, style, cascade_priority, stylesheet_links, SCROLL_STEP, WIDTH, HEIGHT
+from parse.http_parse import HTMLParser
+from parse.css_parse import parse_stylesheet, STYLESHEETS, DECLARATIONS
+from utils.url_request import request
+from utils.concurrent_request import request_all
+from utils.display_list import DisplayList
+from utils.display_index import DisplayIndex
+from utils.canvas_renderer import CanvasRenderer
+from utils.measure_cache import WORD_WIDTHS
+from utils.font_metrics import use_backend, TableMetrics
+from benchmarks.fixture_server import FixtureServer, synthetic_pages
+
+STAGES = ["request", "parse", "css", "style", "layout", "paint", "draw"]
+DRAW_FRAMES = 50 # 처음 그린 뒤 SCROLL_STEP씩 내려가며 그릴 frame 수
+
+class NullCanvas:
+    # Tk가 없는 곳에서 draw 단계를 재기 위한 canvas. item을 실제로 그리지 않고 번호만 나눠준다.
+    def __init__(self):
+        self.next_item = 0
+
+    def create_text(self, *args, **kwargs):
+        self.next_item += 1
+        return self.next_item
+
+    create_rectangle = create_text
+
+    def delete(self, item): pass
+    def move(self, tag, dx, dy): pass
+    def tag_lower(self, item, below): pass
+
+def make_canvas():
+    try:
+        import tkinter
+        window = tkinter.Tk()
+    except Exception: # display가 없거나 tkinter가 없는 경우
+        return "null", NullCanvas()
+    canvas = tkinter.Canvas(window, width=WIDTH, height=HEIGHT)
+    canvas.pack()
+    return "tk", canvas
+
+def clear_caches():
+    # 같은 페이지를 반복해서 재도 매번 처음 읽는 것처럼 재도록 memo들을 비운다.
+    for cache in [STYLESHEETS, DECLARATIONS, WORD_WIDTHS]:
+        cache.clear()
+
+def load(url, default_rules, canvas):
+    '''
+    Browser.load와 같은 순서로 하되, 단계별 시간을 재기 위해 다운로드와 파싱을 겹치지 않는다.
+    '''
+    times = {}
+    start = time.perf_counter()
+    headers, body = request(url, keep_alive=True)
+
+    def lap(stage):
+        nonlocal start
+        now = time.perf_counter()
+        times[stage] = times.get(stage, 0) + now - start
+        start = now
+
+    lap("request")
+    nodes = HTMLParser(body).parse()
+    lap("parse")
+    links = stylesheet_links(nodes, url)
+    responses = request_all(links, use_cache=False)
+    lap("request")
+    rules = default_rules.copy()
+    for response in responses:
+        if response is None: continue
+        rules.extend(parse_stylesheet(response[1]))
+    rules.sort(key=cascade_priority)
+    lap("css")
+    style(nodes, rules)
+    lap("style")
+    document = DocumentLayout(nodes)
+    document.layout()
+    lap("layout")
+    display_list = DisplayList()
+    document.paint(display_list)
+    display_index = DisplayIndex(display_list, HEIGHT)
+    lap("paint")
+    renderer = CanvasRenderer(canvas, overscan=HEIGHT)
+    renderer.reset(display_index)
+    scroll = 0
+    for _ in range(DRAW_FRAMES + 1):
+        renderer.render(scroll, HEIGHT)
+        scroll = max(min(scroll + SCROLL_STEP, document.height - HEIGHT), 0)
+    update = getattr(canvas, "update_idletasks", None)
+    if update: update()
+    lap("draw")
+    renderer.reset(DisplayIndex(DisplayList())) # 다음 페이지를 위해 item을 지운다.
+
+    stats = {"bytes": len(body.encode("utf8")), "stylesheets": len(links),
+             "rules": len(rules), "commands": len(display_list)}
+    return times, stats
+
+def run(urls, repeat, default_rules, canvas):
+    results = {}
+    for name, url in urls:
+        best = {}
+        for _ in range(repeat):
+            clear_caches()
+            times, stats = load(url, default_rules, canvas)
+            for stage in STAGES:
+                best[stage] = min(best.get(stage, float("inf")), times.get(stage, 0))
+        best["total"] = sum(best[stage] for stage in STAGES)
+        results[name] = {"seconds": best, "stats": stats}
+        print("{:<28} ".format(name) + " ".join(
+            "{}={:.3f}".format(stage, best[stage]) for stage in STAGES + ["total"]))
+    return results
+
+def compare(results, baseline, threshold, min_delta):
+    '''
+    baseline보다 threshold(비율) 넘게 느려진 (페이지, 단계)들을 돌려준다.
+    아주 짧은 단계는 잡음이 크므로 min_delta(초)보다 작은 차이는 무시한다.
+    '''
+    regressions = []
+    for name, result in results["pages"].items():
+        before = baseline["pages"].get(name)
+        if before is None: continue
+        for stage in STAGES + ["total"]:
+            old, new = before["seconds"].get(stage), result["seconds"][stage]
+            if old is None: continue
+            if new > old * (1 + threshold) and new - old > min_delta:
+                regressions.append((name, stage, old, new))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Browser.load 단계별 benchmark")
+    parser.add_argument("--scale", type=float, default=1, help="synthetic 페이지 크기 배율")
+    parser.add_argument("--repeat", type=int, default=3, help="페이지마다 반복 횟수. 가장 빠른 값을 쓴다.")
+    parser.add_argument("--output", default="pipeline.json", help="결과 json 파일")
+    parser.add_argument("--baseline", help="비교할 이전 결과 json 파일")
+    parser.add_argument("--save-baseline", help="이번 결과를 baseline으로도 저장할 파일")
+    parser.add_argument("--threshold", type=float, default=0.2, help="이 비율보다 느려지면 regression")
+    parser.add_argument("--min-delta", type=float, default=0.005, help="이 시간(초)보다 작은 차이는 무시")
+    parser.add_argument("--recorded", help="저장해둔 페이지들이 있는 디렉토리")
+    args = parser.parse_args(argv)
+
+    use_backend(TableMetrics())
+    with open("default.css") as f:
+        default_rules = parse_stylesheet(f.read())
+    canvas_name, canvas = make_canvas()
+
+    pages = synthetic_pages(args.scale)
+    with FixtureServer(pages, args.recorded) as server:
+        urls = [(path.rsplit("/", 1)[1], server.base_url + path)
+                for path in pages if path.endswith(".html")]
+        urls += [(path, server.base_url + path) for path in server.recorded_pages()]
+        page_results = run(urls, args.repeat, default_rules, canvas)
+
+    results = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(),
+                 "canvas": canvas_name, "scale": args.scale, "repeat": args.repeat,
+                 "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "pages": page_results,
+    }
+    for path in [args.output, args.save_baseline]:
+        if not path: continue
+        with open(path, "w") as f:
+            json.dump(results, f, indent=1)
+            f.write("\n")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.min_delta)
+        for name, stage, old, new in regressions:
+            print("REGRESSION {} {}: {:.3f}s -> {:.3f}s ({:+.0%})".format(name, stage, old, new, new / old - 1))
+        if regressions:
+            return 1
+        print("no regressions against {}".format(args.baseline))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+'''
+큰 문서에서 style pass를 style 공유 없이/있이 돌려서 시간과 아낀 메모리를 비교한다.
+
+python3 -m benchmarks.style [문단 수] [반복 횟수]
+'''
+import sys
+import time
+import tracemalloc
+
+from browser import style, cascade_priority
+from parse.css_parse import parse_stylesheet
+from parse.http_parse import HTMLParser
+
+CSS = """
+p { color: #333; } a { color: blue; } li { font-size: 90%; }
+article p { font-weight: bold; } nav a { color: green; } ul li a { font-style: italic; }
+"""
+
+def large_html(paragraphs):
+    item = ("<article><p>Lorem ipsum <a href=/x>dolor</a> sit <b>amet</b>, consectetur adipiscing elit.</p>"
+            "<ul><li><a href=/y>one</a></li><li>two</li><li>three</li></ul></article>\n")
+    return "<html><body><nav><a href=/>home</a></nav>" + item * paragraphs + "</body></html>"
+
+def measure(body, rules, share_styles, repeat):
+    best = None
+    for _ in range(repeat):
+        nodes = HTMLParser(body).parse()
+        start = time.perf_counter()
+        stats = style(nodes, rules, share_styles=share_styles)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    # tracemalloc은 시간을 크게 늘리므로 메모리는 따로 한 번 더 돌려서 잰다.
+    nodes = HTMLParser(body).parse()
+    tracemalloc.start()
+    style(nodes, rules, share_styles=share_styles)
+    memory, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, memory, stats
+
+def main(paragraphs=10000, repeat=3):
+    body = large_html(paragraphs)
+    rules = sorted(parse_stylesheet(open("default.css").read()) + parse_stylesheet(CSS), key=cascade_priority)
+    plain_time, plain_memory, plain_stats = measure(body, rules, False, repeat)
+    shared_time, shared_memory, shared_stats = measure(body, rules, True, repeat)
+    nodes = plain_stats["styles_created"]
+    print("nodes             {}".format(nodes))
+    print("styles created    {} (shared by {} nodes)".format(shared_stats["styles_created"], shared_stats["styles_shared"]))
+    print("style memory      {:.1f} MB -> {:.1f} MB (estimated saving {:.1f} MB)".format(
+        plain_memory / 1e6, shared_memory / 1e6, shared_stats["style_bytes_saved"] / 1e6))
+    print("style pass        {:.3f}s -> {:.3f}s ({:.2f}x)".format(plain_time, shared_time, plain_time / shared_time))
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -1,20 +1,54 @@
+import os
+import sys
 import tkinter # https://docs.python.org/ko/3/library/tkinter.html
-import tkinter.font
-from parse.css_parse import CSSParser
-from utils.url_request import request
+from array import array
+from types import MappingProxyType
+from concurrent.futures import ProcessPoolExecutor
+from parse.css_parse import parse_stylesheet, parse_declarations, RuleIndex, AncestorFilter
+from utils.url_request import request_stream
+from utils.concurrent_request import request_all
 from parse.http_parse import HTMLParser, Text, Element, print_tree
+from utils.tree_walk import preorder, traverse
+from utils.measure_cache import WORD_WIDTHS
+from utils.font_metrics import get_backend, use_backend, TkMetrics
+from utils.display_index import DisplayIndex
+from utils.display_list import DisplayList
+from utils.canvas_renderer import CanvasRenderer
+from utils import trace
 
 WIDTH, HEIGHT = 800, 600
 HSTEP, VSTEP = 13, 18
 SCROLL_STEP = 100
-FONTS = {}
+MAX_FETCHES_PER_HOST = 6 # 한 host에 동시에 보내는 subresource 요청 수
+FONTS = {} # font registry. (backend 이름, size, weight, slant) -> FontRecord
+
+class FontRecord:
+    '''
+    metrics backend의 font와 그 font의 ascent, descent, linespace를 함께 담아둔다.
+    metrics는 font마다 변하지 않는데 Tk에서는 font.metrics()가 매번 Tk를 거치므로, 만들 때 한 번만 가져온다.
+    '''
+    def __init__(self, key, backend):
+        self.key = key
+        self.backend = backend
+        backend_name, size, weight, slant = key
+        self.handle = backend.create_font(size, weight, slant)
+        self.ascent, self.descent, self.linespace = backend.metrics(self.handle)
+        self.canvas_font = backend.canvas_font(self.handle)
+
+    def measure(self, text):
+        return self.backend.measure(self.handle, text)
+
+    def __repr__(self):
+        return "FontRecord(key={}, ascent={}, descent={}, linespace={})".format(
+            self.key, self.ascent, self.descent, self.linespace)
 
 # font memorization
 def get_font(size, weight, slant):
-    key = (size, weight, slant)
+    # 글자 폭과 높이는 utils/font_metrics의 backend에서 얻는다. 기본은 Tk이고, Tk 없이 돌릴 때는 TableMetrics로 바꾼다.
+    backend = get_backend()
+    key = (backend.name, size, weight, slant)
     if key not in FONTS:
-        font = tkinter.font.Font(size=size, weight=weight, slant=slant)
-        FONTS[key] = font
+        FONTS[key] = FontRecord(key, backend)
     return FONTS[key]
 
 def resolve_url(url, current):
@@ -36,11 +70,18 @@ def resolve_url(url, current):
         return dir + "/" + url
 
 def tree_to_list(tree, list):
-    list.append(tree)
-    for child in tree.children:
-        tree_to_list(child, list)
+    list.extend(preorder(tree))
     return list
 
+def stylesheet_links(nodes, url):
+    # <link rel=stylesheet href=...>들의 절대 url을 문서에 나온 순서대로
+    return [resolve_url(node.attributes["href"], url)
+            for node in tree_to_list(nodes, [])
+            if isinstance(node, Element)
+            and node.tag == "link"
+            and "href" in node.attributes
+            and node.attributes.get("rel") == "stylesheet"]
+
 
 class TagSelector:
     def __init__(self, tag):
@@ -79,26 +120,71 @@ def compute_style(node, property, value):
     else:
         return value
 
-def style(node, rules):
-    node.style = {}
+def style(root, rules, share_styles=True):
+    '''
+    style pass에서 아낀 일을 counter로 돌려준다.
+    share_styles=True면 부모 style이 같고(같은 객체), 맞은 rule들이 같고, style 속성이 없는 node들은 하나의 style 객체를 같이 쓴다.
+    그래서 node.style은 고칠 수 없는 mapping이다.
+    '''
+    # node마다 모든 rule을 검사하지 않도록 맨 오른쪽 tag로 rule들을 나눠둔다.
+    index = RuleIndex(rules)
+    # 내려가면서 조상 tag를 담아두고, 필요한 조상이 없는 DescendantSelector는 조상 walk 없이 버린다.
+    ancestors = AncestorFilter()
+    shared = {} # (부모 style의 id, 맞은 rule body들의 id) -> style
+    stats = {"styles_created": 0, "styles_shared": 0, "style_bytes_saved": 0}
+    # 부모의 style을 물려받아야 하므로 부모가 자식보다 먼저 나오는 순서로 훑는다.
+    for node, entering in traverse(root):
+        is_element = isinstance(node, Element)
+        if not entering:
+            if is_element: ancestors.remove(node.tag)
+            continue
+
+        matched = []
+        if is_element:
+            matched = [(selector, body) for selector, body in index.candidates(node)
+                       if not ancestors.rejects(selector) and selector.matches(node)]
+            ancestors.add(node.tag)
+
+        shareable = share_styles and not (is_element and "style" in node.attributes)
+        if shareable:
+            # 부모 style 객체들은 pass가 끝날 때까지 node에 붙어 살아 있으므로 id가 다른 객체와 겹치지 않는다.
+            key = (id(node.parent.style) if node.parent else None,
+                   tuple(id(body) for selector, body in matched))
+            if key in shared:
+                node.style, size = shared[key]
+                stats["styles_shared"] += 1
+                stats["style_bytes_saved"] += size
+                continue
+
+        computed = style_node(node, matched)
+        node.style = MappingProxyType(computed)
+        stats["styles_created"] += 1
+        if shareable:
+            shared[key] = (node.style, sys.getsizeof(computed))
+
+    stats["ancestor_walks_avoided"] = ancestors.rejected
+    stats["ancestor_walks"] = ancestors.walked
+    return stats
+
+def style_node(node, matched_rules):
+    # matched_rules는 node에 맞는 rule들만 cascade 순서대로 들어온다.
+    style = {}
     for property, default_value in INHERITED_PROPERTIES.items():
         if node.parent:
-            node.style[property] = node.parent.style[property]
+            style[property] = node.parent.style[property]
         else:
-            node.style[property] = default_value
-    for selector, body in rules:
-        if not selector.matches(node): continue
+            style[property] = default_value
+    for selector, body in matched_rules:
         for property, value in body.items():
             computed_value = compute_style(node, property, value)
             if not computed_value: continue
-            node.style[property] = computed_value
+            style[property] = computed_value
     if isinstance(node, Element) and "style" in node.attributes:
-        pairs = CSSParser(node.attributes["style"]).body()
+        pairs = parse_declarations(node.attributes["style"])
         for property, value in pairs.items():
             computed_value = compute_style(node, property, value)
-            node.style[property] = computed_value
-    for child in node.children:
-        style(child, rules)
+            style[property] = computed_value
+    return style
 
 def cascade_priority(rule):
     selector, body = rule
@@ -126,30 +212,6 @@ def layout_mode(node):
     else:
         return "block"
 
-def resolve_url(url, current):
-    if "://" in url:
-        return url
-    elif url.startswith("/"):
-        scheme, hostpath = current.split("://", 1)
-        host, oldpath = hostpath.split("/", 1)
-        return scheme + "://" + host + url
-    else:
-        scheme, hostpath = current.split("://", 1)
-        if "/" not in hostpath:
-            current = current + "/"
-        dir, _ = current.rsplit("/", 1)
-        while url.startswith("../"):
-            url = url[3:]
-            if dir.count("/") == 2: continue
-            dir, _ = dir.rsplit("/", 1)
-        return dir + "/" + url
-
-def tree_to_list(tree, list):
-    list.append(tree)
-    for child in tree.children:
-        tree_to_list(child, list)
-    return list
-
 
 class BlockLayout:
     def __init__(self, node, parent, previous):
@@ -167,7 +229,30 @@ class BlockLayout:
         '''
         layout은 해당 요소의 size와 position을 계산하는 작업이다.
         '''
+        # 깊게 중첩된 문서에서 재귀 호출이 RecursionError를 내지 않도록, layout tree를 명시적인 stack으로 훑는다.
+        # 자식을 방문하기 전에 자식 layout 객체를 만들고 위치를 정하고, 자식을 다 방문한 뒤에 높이를 정한다.
+        # 이미 layout한 tree를 다시 layout하면 줄바꿈을 다시 해야 하는 InlineLayout만 다시 하고, 나머지는 위치만 옮긴다.
+        # 다시 줄바꿈한 InlineLayout의 수를 돌려준다.
+        rebroken = 0
+        for child, entering in traverse(self):
+            if isinstance(child, InlineLayout):
+                if entering and child.layout(): rebroken += 1
+            elif entering:
+                child.layout_before_children()
+            else:
+                child.layout_after_children()
+        return rebroken
+
+    def layout_before_children(self):
+        self.prepare()
+        self.place()
 
+    def prepare(self):
+        if not self.children: self.build() # 다시 layout할 때는 이미 만든 자식들을 그대로 쓴다.
+        self.width = self.parent.width # 기본적으로 block 요소는 greedy해서 폭을 가질 수 있는 만큼 다 가진다 == 부모 폭을 따라간다.
+        self.x = self.parent.x # each layout object starts at its parent’s left edge
+
+    def build(self):
         # This code is tricky because it involves two trees. 
         # The node and child are part of the HTML tree; but self, previous, and next are part of the layout tree.
         previous = None
@@ -179,9 +264,7 @@ class BlockLayout:
             self.children.append(next)
             previous = next
 
-        self.width = self.parent.width # 기본적으로 block 요소는 greedy해서 폭을 가질 수 있는 만큼 다 가진다 == 부모 폭을 따라간다.
-        self.x = self.parent.x # each layout object starts at its parent’s left edge
-
+    def place(self):
         # The vertical position of a layout object depends on the position and height of their previous sibling. 
         # If there is no previous sibling, they start at the parent’s top edge:
         if self.previous:
@@ -189,72 +272,21 @@ class BlockLayout:
         else:
             self.y = self.parent.y
 
-        for child in self.children:
-            child.layout()
-
+    def layout_after_children(self):
         # should be tall enough to contain all of its children, so its height should be the sum of its children’s heights
         # height depends on the height of its children, its height must be computed after recursing to compute the heights of its children.
         self.height = sum([child.height for child in self.children])
 
     def paint(self, display_list):
-        for child in self.children:
-            child.paint(display_list)
+        # BlockLayout은 직접 그리는 것이 없고, 그리는 일은 InlineLayout들이 문서 순서대로 한다.
+        for child in preorder(self):
+            if isinstance(child, InlineLayout):
+                child.paint(display_list)
 
     def __repr__(self):
         return "BlockLayout(x={}, y={}, width={}, height={}, node={})".format(
             self.x, self.y, self.width, self.height, self.node)
 
-
-
-INHERITED_PROPERTIES = {
-    "font-size": "16px",
-    "font-style": "normal",
-    "font-weight": "normal",
-    "color": "black",
-}
-
-def compute_style(node, property, value):
-    if property == "font-size":
-        if value.endswith("px"):
-            return value
-        elif value.endswith("%"):
-            if node.parent:
-                parent_font_size = node.parent.style["font-size"]
-            else:
-                parent_font_size = INHERITED_PROPERTIES["font-size"]
-            node_pct = float(value[:-1]) / 100
-            parent_px = float(parent_font_size[:-2])
-            return str(node_pct * parent_px) + "px"
-        else:
-            return None
-    else:
-        return value
-
-def style(node, rules):
-    node.style = {}
-    for property, default_value in INHERITED_PROPERTIES.items():
-        if node.parent:
-            node.style[property] = node.parent.style[property]
-        else:
-            node.style[property] = default_value
-    for selector, body in rules:
-        if not selector.matches(node): continue
-        for property, value in body.items():
-            computed_value = compute_style(node, property, value)
-            if not computed_value: continue
-            node.style[property] = computed_value
-    if isinstance(node, Element) and "style" in node.attributes:
-        pairs = CSSParser(node.attributes["style"]).body()
-        for property, value in pairs.items():
-            computed_value = compute_style(node, property, value)
-            node.style[property] = computed_value
-    for child in node.children:
-        style(child, rules)
-
-def cascade_priority(rule):
-    selector, body = rule
-    return selector.priority
-
 class InlineLayout:
     def __init__(self, node, parent, previous):
         self.node = node # layout node에 대응하는 html node
@@ -266,41 +298,93 @@ class InlineLayout:
         self.y = None
         self.width = None
         self.height = None
-        self.display_list = None
+        # 줄바꿈 결과. 단어마다 tuple을 만들지 않고, 문서 순서대로 단어의 x와 y만 array에 담는다.
+        # 단어, font, color는 폭과 상관없으므로 resolved_runs에 run(text node)마다 한 번만 담아둔다.
+        # y는 이 block의 위쪽 끝을 0으로 본 값이라 block이 움직여도 고칠 필요가 없다.
+        self.xs = None
+        self.ys = None
+        self.resolved_runs = None
+
+        # 창 폭이 바뀌어도 줄바꿈 결과가 같으면 다시 하지 않기 위한 상태
+        # 줄바꿈 결과는 x가 같고 폭이 min_width 이상 max_width 미만인 동안은 그대로다.
+        # (놓인 단어는 모두 min_width 안에 들어갔고, 다음 줄로 넘긴 단어는 모두 max_width 이상이 있어야 들어간다)
+        self.dirty = True # 지금 (x, width)로 다시 줄바꿈해야 하는지
+        self.broken_x = None # 줄바꿈할 때의 x
+        self.min_width = 0
+        self.max_width = float("inf")
+        # 바로 전의 줄바꿈 결과 하나만 남겨둔다. (xs, ys, height, broken_x, min_width, max_width)
+        # 창 폭을 줄였다가 되돌리는 경우에 쓰고, 더 많이 남겨두면 긴 문서에서 layout tree의 memory만 커진다.
+        self.previous_lines = None
+
+        # paint할 때의 (xs, y, width)와 display_list에 그린 명령들의 위치 (start, 글자 명령의 start, end)
+        # 명령 수는 폭과 상관없이 같으므로, resize 뒤에는 repaint로 이 자리의 명령만 고쳐 쓴다.
+        self.painted = None
+        self.commands = None
 
     def layout(self):
         '''
         layout은 해당 요소의 size와 position을 계산하는 작업이다.
+        줄바꿈을 새로 했으면 True를 돌려준다.
         '''
+        self.prepare()
+        self.place()
+        if not self.dirty: return False
+        self.break_lines(self.runs())
+        return True
+
+    def runs(self):
+        if self.resolved_runs is None:
+            self.resolved_runs = resolve_runs(inline_runs(self.node))
+        return self.resolved_runs
+
+    def prepare(self):
         self.width = self.parent.width
         self.x = self.parent.x
-
+        if self.xs is not None and lines_fit(self.lines(), self.x, self.width):
+            self.dirty = False
+        elif self.previous_lines and lines_fit(self.previous_lines, self.x, self.width):
+            self.use_lines(*self.previous_lines)
+        else:
+            self.dirty = True
+
+    def lines(self):
+        return (self.xs, self.ys, self.height, self.broken_x, self.min_width, self.max_width)
+
+    def use_lines(self, xs, ys, height, broken_x, min_width, max_width):
+        if self.xs is not None and self.xs is not xs:
+            self.previous_lines = self.lines()
+        self.xs = xs
+        self.ys = ys
+        self.height = height
+        self.broken_x = broken_x
+        self.min_width = min_width
+        self.max_width = max_width
+        self.dirty = False
+
+    def place(self):
         if self.previous:
             self.y = self.previous.y + self.previous.height
         else:
             self.y = self.parent.y
 
-        self.display_list = []
-        self.weight = "normal"
-        self.style = "roman"
-        self.size = 16
+    def break_lines(self, runs):
+        # 줄바꿈은 x, width와 runs(resolve_runs의 결과)만 있으면 되고 DOM node는 필요 없다.
+        self.xs = array("d")
+        self.ys = array("d")
 
         self.cursor_x = self.x
-        self.cursor_y = self.y
+        self.cursor_y = 0
+        self.min_width = 0
+        self.max_width = float("inf")
         self.line = []
-        self.recurse(self.node)
+        for run in runs:
+            if run is None:
+                self.flush()
+            else:
+                self.text(*run)
         self.flush()
 
-        self.height = self.cursor_y - self.y
-
-    def recurse(self, node):
-        if isinstance(node, Text):
-            self.text(node)
-        else:
-            if node.tag == "br":
-                self.flush()
-            for child in node.children:
-                self.recurse(child)
+        self.use_lines(self.xs, self.ys, self.cursor_y, self.x, self.min_width, self.max_width)
 
     def open_tag(self, tag):
         if tag == "i":
@@ -327,178 +411,343 @@ class InlineLayout:
             self.flush()
             self.cursor_y += VSTEP
         
-    def text(self, node):
-        color = node.style["color"]
-        weight = node.style["font-weight"]
-        style = node.style["font-style"]
-        if style == "normal": style = "roman"
-        size = int(float(node.style["font-size"][:-2]) * .75)
-        font = get_font(size, weight, style)
-        for word in node.text.split():
-            w = font.measure(word)
-            if self.cursor_x + w > self.x + self.width:
-                self.flush()
-            self.line.append((self.cursor_x, word, font, color))
-            self.cursor_x += w + font.measure(" ")
+    def text(self, words, font, color):
+        # font.measure는 Tk를 거쳐서 느리므로 같은 font의 같은 단어는 한 번만 잰다.
+        widths = WORD_WIDTHS.measure_words(font.key, font, words)
+        space = WORD_WIDTHS.space_width(font.key, font)
+        for word in words:
+            w = widths[word]
+            need = self.cursor_x + w - self.x # 이 단어를 이 줄에 놓는 데 필요한 폭
+            if self.line: # 줄의 첫 단어는 폭이 모자라도 그 줄에 놓으므로 폭과 상관없다.
+                if need > self.width:
+                    self.max_width = min(self.max_width, need)
+                    self.flush()
+                else:
+                    self.min_width = max(self.min_width, need)
+            self.xs.append(self.cursor_x)
+            self.line.append(font) # 줄의 y는 줄이 끝나야 정해지므로 flush까지 단어의 font만 모아둔다.
+            self.cursor_x += w + space
 
     def flush(self):
         if not self.line: return
-        metrics = [font.metrics() for x, word, font, color in self.line]
-        max_ascent = max([metric["ascent"] for metric in metrics])
+        # font마다 미리 가져둔 metrics를 쓰므로 여기서는 Tk를 부르지 않는다.
+        max_ascent = max([font.ascent for font in self.line])
         baseline = self.cursor_y + 1.25 * max_ascent
-        for x, word, font, color in self.line:
-            y = baseline - font.metrics("ascent")
-            self.display_list.append((x, y, word, font, color))
+        self.ys.extend([baseline - font.ascent for font in self.line])
+        max_descent = max([font.descent for font in self.line])
         self.cursor_x = self.x
         self.line = []
-        max_descent = max([metric["descent"] for metric in metrics])
         self.cursor_y = baseline + 1.25 * max_descent
 
     def paint(self, display_list):
+        start = len(display_list)
         bgcolor = self.node.style.get("background-color", "transparent")
         if bgcolor != "transparent":
             x2, y2 = self.x + self.width, self.y + self.height
-            rect = DrawRect(self.x, self.y, x2, y2, bgcolor)
-            display_list.append(rect)
-        for x, y, word, font, color in self.display_list:
-            display_list.append(DrawText(x, y, word, font, color))
+            display_list.add_rect(self.x, self.y, x2, y2, bgcolor)
+        text_start = len(display_list)
+        xs, ys = self.xs, self.ys
+        i = 0
+        for run in self.runs():
+            if run is None: continue
+            words, font, color = run
+            for word in words:
+                display_list.add_text(xs[i], self.y + ys[i], word, font, color)
+                i += 1
+        self.painted = (self.xs, self.y, self.width)
+        self.commands = (start, text_start, len(display_list))
+
+    def repaint(self, display_list):
+        '''
+        paint한 뒤에 layout이 바뀌었으면 display_list에 그려둔 명령들을 제자리에서 고친다. 고친 것이 있으면 True를 돌려준다.
+        다시 줄바꿈했으면 글자 명령을 모두 새로 놓고, 위치만 옮겨졌으면 y만 옮기고, 폭만 바뀌었으면 배경만 고친다.
+        '''
+        xs, y, width = self.painted
+        if self.xs is xs and self.y == y and self.width == width: return False
+        start, text_start, end = self.commands
+        lefts, tops, rights, bottoms = display_list.lefts, display_list.tops, display_list.rights, display_list.bottoms
+        if start < text_start: # 배경
+            lefts[start], tops[start] = self.x, self.y
+            rights[start], bottoms[start] = self.x + self.width, self.y + self.height
+        if self.xs is not xs:
+            # 글자 명령의 높이(font.linespace)는 폭과 상관없으므로 font를 찾지 않고 그대로 둔다.
+            for i, x, word_y in zip(range(text_start, end), self.xs, self.ys):
+                linespace = bottoms[i] - tops[i]
+                lefts[i] = rights[i] = x
+                tops[i] = self.y + word_y
+                bottoms[i] = tops[i] + linespace
+        elif self.y != y:
+            dy = self.y - y
+            for i in range(text_start, end):
+                tops[i] += dy
+                bottoms[i] += dy
+        self.painted = (self.xs, self.y, self.width)
+        return True
+
     def __repr__(self):
         return "InlineLayout(x={}, y={}, width={}, height={}, node={})".format(
             self.x, self.y, self.width, self.height, self.node)
 
+def inline_runs(node):
+    '''
+    InlineLayout의 줄바꿈에 필요한 것만 문서 순서대로 뽑아낸다. Text는 (text, size, weight, style, color), <br>은 None.
+    '''
+    runs = []
+    for child in preorder(node):
+        if isinstance(child, Text):
+            weight = child.style["font-weight"]
+            style = child.style["font-style"]
+            if style == "normal": style = "roman"
+            size = int(float(child.style["font-size"][:-2]) * .75)
+            runs.append((child.text, size, weight, style, child.style["color"]))
+        elif child.tag == "br":
+            runs.append(None)
+    return runs
+
+def lines_fit(lines, x, width):
+    # InlineLayout.lines()로 얻은 줄바꿈 결과를 (x, width)에서도 그대로 쓸 수 있는지
+    xs, ys, height, broken_x, min_width, max_width = lines
+    return broken_x == x and min_width <= width < max_width
+
+def resolve_runs(runs):
+    # inline_runs의 결과를 줄바꿈과 paint에 쓰는 (words, font, color)로 바꾼다. font는 run마다 한 번만 찾는다.
+    return [None if run is None else (run[0].split(), get_font(*run[1:4]), run[4]) for run in runs]
+
+def break_lines(runs, x, width):
+    '''
+    worker process에서 InlineLayout 하나의 줄바꿈을 y=0 기준으로 한다.
+    단어나 font는 돌려보내지 않고 단어마다의 x, y array만 돌려보낸다. (array는 byte 그대로 pickle되므로 주고받는 양이 작다)
+    단어와 font는 받는 쪽이 paint할 때 InlineLayout.runs()로 run마다 한 번씩 만든다.
+    '''
+    inline = InlineLayout(None, None, None)
+    inline.x, inline.width = x, width
+    inline.break_lines(resolve_runs(runs))
+    return inline.xs, inline.ys, inline.height, inline.min_width, inline.max_width
+
+def layout_parallel(root, executor):
+    '''
+    형제 block들의 폭은 서로 영향을 주지 않고, y만 앞 형제의 높이에 따라 이어진다.
+    그래서 먼저 layout tree를 만들고 폭을 정한 다음, 모든 InlineLayout의 줄바꿈을 executor(process pool)에서 한꺼번에 하고,
+    마지막으로 가볍게 한 번 더 훑으면서 y와 높이만 정한다.
+
+    주의할 점
+    - 1, 3단계와 run을 보내고 결과를 받는 일은 이 process에서 하므로, core 수를 늘려도 이만큼은 줄지 않는다.
+      core가 적거나 문서가 짧으면 한 process에서 하는 것(executor=None)보다 느리다. benchmarks/layout.py로 재보고 쓴다.
+    - Tk backend(기본값)에서는 worker process가 Tk font를 만들 수 없으므로 executor를 쓰지 않고 이 process에서 줄바꿈한다.
+      TableMetrics 같은 Tk 없는 backend일 때만 실제로 나눠 한다.
+    - Browser는 이 방식을 쓰지 않는다. headless 렌더링이나 benchmark에서 DocumentLayout.layout(executor)로 쓴다.
+    '''
+    # 1. layout tree를 만들고 x, width를 정한다. 다시 줄바꿈해야 하는 InlineLayout만 모은다.
+    inlines = []
+    for child, entering in traverse(root):
+        if not entering: continue
+        child.prepare()
+        if isinstance(child, InlineLayout) and child.dirty:
+            inlines.append(child)
+
+    # 2. 줄바꿈. Tk font는 process마다 Tk interpreter가 있어야 하므로 Tk backend일 때는 이 process에서 한다.
+    if isinstance(get_backend(), TkMetrics):
+        for inline in inlines:
+            inline.break_lines(inline.runs())
+    else:
+        chunksize = max(1, len(inlines) // (4 * (os.cpu_count() or 1)))
+        results = executor.map(break_lines, [inline_runs(i.node) for i in inlines],
+                               [i.x for i in inlines], [i.width for i in inlines], chunksize=chunksize)
+        for inline, (xs, ys, height, min_width, max_width) in zip(inlines, results):
+            inline.use_lines(xs, ys, height, inline.x, min_width, max_width)
+
+    # 3. 앞 형제의 높이를 따라 y를 정한다. 줄들은 block 기준 좌표라 block만 옮기면 된다.
+    for child, entering in traverse(root):
+        if entering:
+            child.place()
+        elif not isinstance(child, InlineLayout):
+            child.layout_after_children()
+    return len(inlines)
+
+def layout_pool(max_workers=None):
+    # worker들도 지금과 같은 metrics backend로 재도록 넘겨준다.
+    return ProcessPoolExecutor(max_workers=max_workers, initializer=use_backend, initargs=(get_backend(),))
+
 class DocumentLayout:
     '''
     The browser walks the HTML tree to produce the layout tree, 
     then computes the size and position for each layout object, 
     and finally draws each layout object to the screen.
     '''
-    def __init__(self, node):
+    def __init__(self, node, viewport_width=WIDTH):
         self.node = node
         self.parent = None
         self.previous = None
         self.children = []
+        self.viewport_width = viewport_width
 
-    def layout(self):
+    def layout(self, executor=None):
         '''
         layout은 해당 요소의 size와 position을 계산하는 작업이다.
+        executor(layout_pool())를 넘기면 InlineLayout들의 줄바꿈을 여러 process에서 나눠 한다. (layout_parallel의 주의할 점 참고)
+        줄바꿈을 새로 한 InlineLayout의 수를 돌려준다.
         '''
-        child = BlockLayout(self.node, self, None)
-        self.children.append(child)
+        if not self.children:
+            self.children.append(BlockLayout(self.node, self, None))
+        child = self.children[0]
 
-        self.width = WIDTH - 2 * HSTEP
+        self.width = self.viewport_width - 2 * HSTEP
         self.x = HSTEP
         self.y = VSTEP
-        child.layout()
+        if executor is None:
+            rebroken = child.layout()
+        else:
+            rebroken = layout_parallel(child, executor)
         self.height = child.height + 2 * VSTEP
+        return rebroken
+
+    def resize(self, viewport_width, executor=None):
+        '''
+        창 폭이 바뀌었을 때 layout tree를 새로 만들지 않고, 줄바꿈 결과가 달라지는 InlineLayout만 다시 줄바꿈한다.
+        '''
+        self.viewport_width = viewport_width
+        return self.layout(executor)
 
     def paint(self, display_list):
         self.children[0].paint(display_list)
 
-    def __repr__(self):
-        return "DocumentLayout()"
-
-class DrawText:
-    def __init__(self, x1, y1, text, font, color):
-        self.top = y1
-        self.left = x1
-        self.text = text
-        self.font = font
-        self.color = color
-
-        self.bottom = y1 + font.metrics("linespace")
-
-    def execute(self, scroll, canvas):
-        canvas.create_text(
-            self.left, self.top - scroll,
-            text=self.text,
-            font=self.font,
-            anchor='nw',
-            fill=self.color,
-        )
-
-    def __repr__(self):
-        return "DrawText(text={})".format(self.text)
-
-
-
-class DrawRect:
-    def __init__(self, x1, y1, x2, y2, color):
-        self.top = y1
-        self.left = x1
-        self.bottom = y2
-        self.right = x2
-        self.color = color
-
-    def execute(self, scroll, canvas):
-        canvas.create_rectangle(
-            self.left, self.top - scroll,
-            self.right, self.bottom - scroll,
-            width=0,
-            fill=self.color,
-        )
+    def repaint(self, display_list):
+        '''
+        resize 뒤에 display_list를 새로 만들지 않고, paint한 뒤로 바뀐 InlineLayout의 명령만 제자리에서 고친다.
+        높이가 바뀐 block보다 앞의 명령은 y가 그대로이므로 뒤쪽 명령만 옮겨진다.
+        (고친 명령 위치의 범위 [(start, end), ...], 명령의 top이나 bottom이 바뀌었는지)를 돌려준다.
+        '''
+        changed = []
+        moved = False
+        for child in preorder(self.children[0]):
+            if not isinstance(child, InlineLayout): continue
+            xs, y, width = child.painted
+            if not child.repaint(display_list): continue
+            moved = moved or child.xs is not xs or child.y != y
+            start, text_start, end = child.commands
+            if changed and changed[-1][1] == start: # 이어진 범위는 하나로 합친다.
+                changed[-1] = (changed[-1][0], end)
+            else:
+                changed.append((start, end))
+        return changed, moved
 
     def __repr__(self):
-        return "DrawRect(top={} left={} bottom={} right={} color={})".format(
-            self.top, self.left, self.bottom, self.right, self.color)
+        return "DocumentLayout()"
 
 class Browser():
     def __init__(self) -> None:
         self.window = tkinter.Tk() # Talks to your operating system to create a window
-        self.canvas = tkinter.Canvas(self.window, width=WIDTH, height=HEIGHT)
-        self.canvas.pack()
+        self.width, self.height = WIDTH, HEIGHT
+        self.canvas = tkinter.Canvas(self.window, width=self.width, height=self.height)
+        self.canvas.pack(fill="both", expand=True)
+        self.canvas.bind("<Configure>", self.resize)
+        self.pending_relayout = None # after_idle로 걸어둔 relayout
 
         self.scroll = 0
         self.window.bind("<Down>", self.scrolldown)
-        self.display_list = [] # display_list는 무엇을 어떻게 그리라는 명령어의 리스트.
+        self.display_list = DisplayList() # display_list는 무엇을 어떻게 그리라는 명령어의 리스트.
+        self.display_index = DisplayIndex(self.display_list, self.height)
+        self.renderer = CanvasRenderer(self.canvas, overscan=self.height)
+        self.window.bind("<F12>", self.print_draw_stats)
 
         with open("default.css") as f:
-            self.default_style_sheet = CSSParser(f.read()).parse()
+            self.default_style_sheet = parse_stylesheet(f.read())
 
     def load(self, url):
-        headers, body = request(url)
-        self.nodes = HTMLParser(body).parse()
+        with trace.span("load", url=url):
+            self.load_document(url)
+
+    def load_document(self, url):
+        # body를 다 받을 때까지 기다리지 않고 도착하는 대로 parser에 넘겨서 다운로드와 파싱을 겹친다.
+        # 그래서 "request+parse" 구간에는 network를 기다린 시간도 들어 있고, tokenize 구간만 parser가 일한 시간이다.
+        with trace.span("request+parse"):
+            headers, chunks = request_stream(url, keep_alive=True, use_cache=True)
+            parser = HTMLParser()
+            for chunk in chunks:
+                with trace.span("tokenize", chars=len(chunk)):
+                    parser.feed(chunk)
+            self.nodes = parser.close()
 
         rules = self.default_style_sheet.copy()
-        links = [node.attributes["href"]
-                for node in tree_to_list(self.nodes, [])
-                if isinstance(node, Element)
-                and node.tag == "link"
-                and "href" in node.attributes
-                and node.attributes.get("rel") == "stylesheet"]
-        for link in links:
-            try:
-                header, body = request(resolve_url(link, url))
-            except:
-                continue
-            rules.extend(CSSParser(body).parse())
-        style(self.nodes, sorted(rules, key=cascade_priority))
-
-        self.document = DocumentLayout(self.nodes)
-        self.document.layout()
-        self.display_list = []
-        self.document.paint(self.display_list)
+        # stylesheet들은 동시에 받아오되, cascade 순서가 바뀌지 않도록 문서에 나온 순서대로 rules에 넣는다.
+        with trace.span("stylesheets"):
+            responses = request_all(stylesheet_links(self.nodes, url),
+                                    max_per_host=MAX_FETCHES_PER_HOST, use_cache=True)
+        with trace.span("css"):
+            for response in responses:
+                if response is None: continue
+                header, body = response
+                rules.extend(parse_stylesheet(body))
+        trace.counter("rules", count=len(rules))
+        with trace.span("style"):
+            stats = style(self.nodes, sorted(rules, key=cascade_priority))
+        trace.counter("nodes", count=stats["styles_created"] + stats["styles_shared"])
+
+        self.document = DocumentLayout(self.nodes, self.width)
+        misses = WORD_WIDTHS.misses
+        with trace.span("layout"):
+            self.document.layout()
+        trace.counter("words measured", count=WORD_WIDTHS.misses - misses)
+        self.paint()
         self.draw()
 
+    def paint(self):
+        with trace.span("paint"):
+            self.display_list = DisplayList()
+            self.document.paint(self.display_list)
+            self.display_index = DisplayIndex(self.display_list, self.height)
+            self.renderer.reset(self.display_index)
+        trace.counter("display list", commands=len(self.display_list))
+
     def draw(self):
         '''
         draw는, layout 연산을 통해 나온 display_list를 실제로 브라우저에 그리는 일이다.
         '''
-        self.canvas.delete("all")
+        # 빠르게 스크롤이 동작하기 위해서 스크롤 내에 존재하지 않는 char는 create_text를 하지 않도록 한다.
+        # 매번 전부 지우고 다시 만드는 대신 renderer가 만들어 둔 item을 옮기고, 화면 근처로 새로 들어온 명령만 item으로 만든다.
+        with trace.span("draw", scroll=self.scroll):
+            self.renderer.render(self.scroll, self.height)
+        trace.counter("canvas items", count=len(self.renderer.items))
 
-        for cmd in self.display_list:
-            # 빠르게 스크롤이 동작하기 위해서 스크롤 내에 존재하지 않는 char는 create_text를 하지 않도록 한다.
-            # 이 최적화를 하느냐, 안 하느냐에 따라서 생각보다 스크롤 속도에 차이가 존재한다.
-            if cmd.top > self.scroll + HEIGHT: continue
-            if cmd.bottom < self.scroll: continue
-            cmd.execute(self.scroll, self.canvas)
+    def print_draw_stats(self, e):
+        print(self.renderer.stats())
 
     def scrolldown(self, e):
-        max_y = self.document.height - HEIGHT
+        max_y = self.document.height - self.height
         self.scroll = min(self.scroll + SCROLL_STEP, max_y)
         self.draw()
 
+    def resize(self, e):
+        if (e.width, e.height) == (self.width, self.height): return
+        self.width, self.height = e.width, e.height
+        # 창을 끌어서 크기를 바꾸면 <Configure>가 연달아 오므로, 올 때마다 relayout하지 않고
+        # event loop가 한가해졌을 때 마지막 크기로 한 번만 한다.
+        if self.pending_relayout is None:
+            self.pending_relayout = self.window.after_idle(self.relayout)
+
+    def relayout(self):
+        self.pending_relayout = None
+        if not hasattr(self, "document"): return
+        if self.width != self.document.viewport_width:
+            # 폭이 바뀌면 줄바꿈이 달라지는 block만 다시 layout하고, 나머지는 위치만 옮긴다.
+            with trace.span("relayout", width=self.width) as span:
+                span.set(rebroken=self.document.resize(self.width))
+            # display_list도 새로 만들지 않고 바뀐 명령만 고친다. 아무것도 바뀌지 않았으면 renderer도 그대로 둔다.
+            with trace.span("repaint") as span:
+                changed, moved = self.document.repaint(self.display_list)
+                if moved:
+                    self.display_index = DisplayIndex(self.display_list, self.height)
+                if changed:
+                    span.set(items=self.renderer.refresh(self.display_index, changed))
+        # 폭이 넓어져 문서가 짧아졌으면 문서 끝을 지나 스크롤된 채로 남지 않게 한다.
+        self.scroll = max(0, min(self.scroll, self.document.height - self.height))
+        self.draw()
 
 if __name__ == "__main__":
     import sys
-    Browser().load(sys.argv[1]) # browser를 켭니다.
+    args = sys.argv[1:]
+    if args[:1] == ["--trace"]: # python3 browser.py --trace trace.json <url>
+        trace.enable(args[1])
+        args = args[2:]
+    Browser().load(args[0]) # browser를 켭니다.
     tkinter.mainloop() # event loop for updated browser canvas triggered.
@@ -0,0 +1,46 @@
+from parse.http_parse import HTMLParser
+
+class CharHTMLParser(HTMLParser):
+    '''
+    한 글자씩 text += c로 token을 만들던 이전 tokenizer. benchmarks/html_parse.py에서 비교 기준으로 쓴다.
+    '''
+    def __init__(self, body=""):
+        super().__init__(body)
+        self.text = ""
+
+    def feed(self, chunk):
+        text = self.text
+        in_tag = self.in_tag
+        for c in chunk:
+            if c == "<":
+                in_tag = True
+                if text: self.add_text(text)
+                text = ""
+            elif c == ">":
+                in_tag = False
+                self.add_tag(text)
+                text = ""
+            else:
+                text += c
+        self.text = text
+        self.in_tag = in_tag
+
+    def close(self):
+        if not self.in_tag and self.text:
+            self.add_text(self.text)
+        self.text = ""
+        return self.finish()
+
+    def get_attributes(self, text):
+        parts = text.split()
+        tag = parts[0].lower()
+        attributes = {}
+        for attrpair in parts[1:]:
+            if "=" in attrpair:
+                key, value = attrpair.split("=", 1)
+                if len(value) > 2 and value[0] in ["'", "\""]:
+                    value = value[1:-1]
+                attributes[key.lower()] = value
+            else:
+                attributes[attrpair.lower()] = ""
+        return tag, attributes
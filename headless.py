@@ -0,0 +1,143 @@
+'''
+Tk 창 없이 여러 페이지를 한꺼번에 렌더링한다. (fetch -> parse -> style -> layout -> paint)
+페이지마다 display list를 파일로 남기고, 단계별 시간과 문서 높이를 한 줄짜리 json으로 쌓아서
+layout 결과가 바뀌었는지 비교하거나(regression snapshot) 문서 높이를 훑어보는 데 쓴다.
+
+페이지들은 ProcessPoolExecutor의 worker들이 나눠서 하므로 core 수만큼 처리량이 늘어난다.
+font 크기는 Tk 대신 TableMetrics(font_metrics.json)로 잰다.
+
+python3 headless.py [--workers N] [--out DIR] [--format text|binary] [--cache] (--list FILE | URL ...)
+
+DIR 안에 생기는 것
+- results.jsonl: 페이지마다 {"url", "dump", "height", "commands", "seconds": {단계: 초}} 또는 {"url", "error"}
+- <url의 sha256 앞 16글자>.txt (또는 .dl): display list. binary는 DisplayList.load로 다시 열 수 있다.
+'''
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from browser import DocumentLayout, style, cascade_priority, stylesheet_links, MAX_FETCHES_PER_HOST
+from parse.http_parse import HTMLParser
+from parse.css_parse import parse_stylesheet
+from utils.url_request import request
+from utils.concurrent_request import request_all
+from utils.display_list import DisplayList, DrawText
+from utils.font_metrics import use_backend, TableMetrics
+
+DEFAULT_STYLE_SHEET = None # worker process마다 한 번만 읽는다.
+
+def init_worker():
+    global DEFAULT_STYLE_SHEET
+    use_backend(TableMetrics())
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "default.css")) as f:
+        DEFAULT_STYLE_SHEET = parse_stylesheet(f.read())
+
+def render(url, use_cache=False):
+    '''
+    Browser.load와 같은 순서로 하되 창에 그리지 않고 (DisplayList, 문서 높이, 단계별 시간)을 돌려준다.
+    '''
+    seconds = {}
+    start = time.perf_counter()
+
+    def lap(stage):
+        nonlocal start
+        now = time.perf_counter()
+        seconds[stage] = seconds.get(stage, 0) + now - start
+        start = now
+
+    headers, body = request(url, keep_alive=True, use_cache=use_cache)
+    lap("fetch")
+    nodes = HTMLParser(body).parse()
+    lap("parse")
+    responses = request_all(stylesheet_links(nodes, url),
+                            max_per_host=MAX_FETCHES_PER_HOST, use_cache=use_cache)
+    lap("fetch")
+    rules = DEFAULT_STYLE_SHEET.copy()
+    for response in responses:
+        if response is None: continue
+        rules.extend(parse_stylesheet(response[1]))
+    style(nodes, sorted(rules, key=cascade_priority))
+    lap("style")
+    document = DocumentLayout(nodes)
+    document.layout()
+    lap("layout")
+    display_list = DisplayList()
+    document.paint(display_list)
+    lap("paint")
+    return display_list, document.height, seconds
+
+def dump_text(display_list, path):
+    # 한 줄에 명령 하나. diff로 비교하기 쉽도록 좌표는 소수점 둘째 자리까지만 쓴다.
+    with open(path, "w", encoding="utf8") as f:
+        for cmd in display_list:
+            if isinstance(cmd, DrawText):
+                f.write("text {:.2f} {:.2f} {} {} {}\n".format(
+                    cmd.left, cmd.top, "/".join(str(part) for part in cmd.font.key[1:]), cmd.color, cmd.text))
+            else:
+                f.write("rect {:.2f} {:.2f} {:.2f} {:.2f} {}\n".format(
+                    cmd.left, cmd.top, cmd.right, cmd.bottom, cmd.color))
+
+def render_page(job):
+    url, out_dir, dump_format, use_cache = job
+    start = time.perf_counter()
+    try:
+        display_list, height, seconds = render(url, use_cache)
+        name = hashlib.sha256(url.encode("utf8")).hexdigest()[:16]
+        if dump_format == "binary":
+            dump = name + ".dl"
+            display_list.save(os.path.join(out_dir, dump))
+        else:
+            dump = name + ".txt"
+            dump_text(display_list, os.path.join(out_dir, dump))
+    except Exception as e: # 한 페이지가 실패해도 나머지는 계속한다.
+        return {"url": url, "error": "{}: {}".format(type(e).__name__, e),
+                "seconds": {"total": time.perf_counter() - start}}
+    seconds["total"] = time.perf_counter() - start
+    return {"url": url, "dump": dump, "height": height, "commands": len(display_list),
+            "seconds": seconds, "pid": os.getpid()}
+
+def read_urls(path):
+    # 한 줄에 url 하나. 빈 줄과 #으로 시작하는 줄은 건너뛴다.
+    with open(path, encoding="utf8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tk 없이 여러 페이지를 렌더링해서 display list와 시간을 남긴다.")
+    parser.add_argument("urls", nargs="*", help="렌더링할 url들")
+    parser.add_argument("--list", help="url 목록 파일 (한 줄에 하나)")
+    parser.add_argument("--out", default="headless-out", help="결과를 쓸 디렉토리")
+    parser.add_argument("--workers", type=int, default=None, help="worker process 수 (기본: core 수)")
+    parser.add_argument("--format", choices=["text", "binary"], default="text", help="display list를 쓸 형식")
+    parser.add_argument("--cache", action="store_true", help="HTTP cache를 쓴다")
+    args = parser.parse_args(argv)
+
+    urls = list(args.urls)
+    if args.list:
+        urls += read_urls(args.list)
+    if not urls:
+        parser.error("url이나 --list가 필요하다")
+    os.makedirs(args.out, exist_ok=True)
+
+    workers = args.workers or os.cpu_count()
+    jobs = [(url, args.out, args.format, args.cache) for url in urls]
+    chunksize = max(1, len(jobs) // (4 * workers))
+    start = time.perf_counter()
+    failures = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor, \
+            open(os.path.join(args.out, "results.jsonl"), "w", encoding="utf8") as results:
+        for result in executor.map(render_page, jobs, chunksize=chunksize):
+            results.write(json.dumps(result, ensure_ascii=False) + "\n")
+            if "error" in result:
+                failures += 1
+                print("FAIL {} {}".format(result["url"], result["error"]), file=sys.stderr)
+    elapsed = time.perf_counter() - start
+    print("{} pages ({} failed) in {:.2f}s with {} workers: {:.1f} pages/s".format(
+        len(urls), failures, elapsed, workers, len(urls) / elapsed), file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,8 @@
+import hashlib
+import heapq
+import threading
+from collections import OrderedDict
+
 from parse.http_parse import Element
 
 class CSSParser:
@@ -87,6 +92,52 @@ class CSSParser:
                     break
         return rules
 
+class ParseCache:
+    '''
+    파싱 결과를 내용(content)을 key로 max_size개까지 들고 있는 LRU cache.
+    같은 stylesheet나 같은 style 속성 문자열은 process 안에서 한 번만 파싱된다.
+    돌려주는 결과는 여러 곳에서 공유하므로 받은 쪽에서 고치면 안 된다.
+    '''
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, parse):
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            self.misses += 1
+        value = parse()
+        with self.lock:
+            self.entries[key] = value
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __repr__(self):
+        return "ParseCache(hits={}, misses={}, size={})".format(self.hits, self.misses, len(self.entries))
+
+STYLESHEETS = ParseCache(64)
+DECLARATIONS = ParseCache(4096)
+
+def parse_stylesheet(s):
+    # stylesheet는 클 수 있으므로 문자열 자체 대신 digest를 key로 들고 있는다.
+    key = hashlib.sha256(s.encode("utf8")).digest()
+    return list(STYLESHEETS.get(key, lambda: CSSParser(s).parse()))
+
+def parse_declarations(s):
+    # style 속성 값은 짧으므로 문자열 자체를 key로 쓴다. (dict가 내용으로 hash 한다)
+    return DECLARATIONS.get(s, lambda: CSSParser(s).body())
+
 class TagSelector:
     def __init__(self, tag):
         self.tag = tag
@@ -115,3 +166,89 @@ class DescendantSelector:
     def __repr__(self):
         return ("DescendantSelector(ancestor={}, descendant={}, priority={})") \
             .format(self.ancestor, self.descendant, self.priority)
+
+def rightmost_tag(selector):
+    # 'div p a'는 DescendantSelector(DescendantSelector(div, p), a)이므로 descendant 쪽을 따라가면 맨 오른쪽 tag가 나온다.
+    while isinstance(selector, DescendantSelector):
+        selector = selector.descendant
+    if isinstance(selector, TagSelector):
+        return selector.tag
+    return None
+
+class RuleIndex:
+    '''
+    rule들을 selector의 맨 오른쪽 tag별로 나눠 담아서, node마다 모든 rule을 검사하지 않고 tag가 맞는 후보만 검사하도록 합니다.
+    맨 오른쪽 tag가 없는 selector는 universal bucket에 담겨 모든 element의 후보가 된다.
+    rules는 cascade 순서(sorted(rules, key=cascade_priority))대로 들어와야 하고, 후보들도 그 순서를 그대로 지켜서 나온다.
+    '''
+    def __init__(self, rules):
+        self.buckets = {} # tag -> [(순서, selector, body)]
+        self.universal = []
+        for position, (selector, body) in enumerate(rules):
+            tag = rightmost_tag(selector)
+            if tag is None:
+                self.universal.append((position, selector, body))
+            else:
+                self.buckets.setdefault(tag, []).append((position, selector, body))
+        self.merged = {} # tag -> universal bucket과 합쳐서 cascade 순서로 정렬해둔 후보들
+
+    def candidates(self, node):
+        if not isinstance(node, Element): return []
+        if node.tag not in self.merged:
+            bucket = self.buckets.get(node.tag, [])
+            if self.universal:
+                bucket = list(heapq.merge(bucket, self.universal))
+            self.merged[node.tag] = [(selector, body) for position, selector, body in bucket]
+        return self.merged[node.tag]
+
+    def __repr__(self):
+        return "RuleIndex(tags={}, universal={})".format(len(self.buckets), len(self.universal))
+
+def ancestor_tags(selector):
+    # 'div p a'에서 a가 맞으려면 조상 중에 div와 p가 반드시 있어야 한다.
+    tags = []
+    while isinstance(selector, DescendantSelector):
+        tags.append(rightmost_tag(selector.ancestor))
+        selector = selector.ancestor
+    return [tag for tag in tags if tag is not None]
+
+class AncestorFilter:
+    '''
+    style()이 tree를 내려가면서 지금 node의 조상 tag들을 담아두는 counting Bloom filter.
+    DescendantSelector는 조상을 root까지 거슬러 올라가며 확인하는데, 필요한 조상 tag가 filter에 없으면 그 walk 없이 바로 버릴 수 있다.
+    Bloom filter는 "없다"는 답만 확실하므로, 있을 수도 있다고 나오면 원래대로 조상을 거슬러 올라가 확인한다.
+    나갈 때 빼줘야 하므로 bit 대신 counter를 쓴다.
+    '''
+    SIZE = 1024
+
+    def __init__(self):
+        self.counts = [0] * self.SIZE
+        self.required = {} # selector -> 필요한 조상 tag들의 slot
+        self.rejected = 0 # filter만 보고 버려서 조상 walk를 아낀 횟수
+        self.walked = 0 # filter를 통과해서 실제로 조상 walk를 한 횟수
+
+    def slots(self, tag):
+        h = hash(tag)
+        return (h % self.SIZE, (h >> 16) % self.SIZE)
+
+    def add(self, tag):
+        for slot in self.slots(tag):
+            self.counts[slot] += 1
+
+    def remove(self, tag):
+        for slot in self.slots(tag):
+            self.counts[slot] -= 1
+
+    def rejects(self, selector):
+        if not isinstance(selector, DescendantSelector): return False
+        if selector not in self.required:
+            self.required[selector] = [slot for tag in ancestor_tags(selector) for slot in self.slots(tag)]
+        for slot in self.required[selector]:
+            if not self.counts[slot]:
+                self.rejected += 1
+                return True
+        self.walked += 1
+        return False
+
+    def __repr__(self):
+        return "AncestorFilter(rejected={}, walked={})".format(self.rejected, self.walked)
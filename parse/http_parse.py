@@ -1,16 +1,31 @@
+import re
+import sys
+from types import MappingProxyType
+
+from utils.tree_walk import traverse
+
+# 큰 문서에는 node가 수십만 개 생기므로 node마다 __dict__를 두지 않도록 __slots__를 쓴다.
+# style은 browser.style()이 나중에 채운다.
+
+EMPTY_ATTRIBUTES = MappingProxyType({}) # attribute가 없는 element들이 같이 쓰는 빈 mapping. 고칠 수 없다.
+
 class Text:
+    __slots__ = ("text", "parent", "style")
+    children = () # Text는 자식이 없으므로 모든 Text가 빈 tuple 하나를 같이 쓴다.
+
     def __init__(self, text, parent):
         self.text = text
-        self.children = []
         self.parent = parent
 
     def __repr__(self):
         return repr(self.text)
 
 class Element:
+    __slots__ = ("tag", "attributes", "children", "parent", "style")
+
     def __init__(self, tag, attributes, parent):
-        self.tag = tag
-        self.attributes = attributes
+        self.tag = sys.intern(tag) # 같은 tag 이름을 node마다 따로 들고 있지 않도록
+        self.attributes = attributes or EMPTY_ATTRIBUTES
         self.children = []
         self.parent = parent
 
@@ -19,50 +34,73 @@ class Element:
         return "<" + self.tag + "".join(attrs) + ">"
 
 def print_tree(node, indent=0):
-    print(" " * indent, node)
-    for child in node.children:
-        print_tree(child, indent + 2)
+    for child, entering in traverse(node):
+        if entering:
+            print(" " * indent, child)
+            indent += 2
+        else:
+            indent -= 2
+
+TAG_DELIMITER = re.compile("([<>])")
+ATTRIBUTE = re.compile(r"""([^\s=]+)(?:\s*=\s*("[^"]*"|'[^']*'|[^\s"']*))?""")
 
 class HTMLParser:
     '''
     source html를 파싱하여 DOM tree를 그립니다.
     '''
-    def __init__(self, body):
+    def __init__(self, body=""):
         self.body = body
         self.unfinished = [] # 닫히지 않고 열린 태그가 여기에 담김 
+        # feed()로 조각조각 들어오는 경우에도 tag나 text가 조각 경계에서 잘릴 수 있으므로 tokenizer 상태를 들고 있는다.
+        self.parts = [] # 아직 <나 >를 만나지 못한 text/tag 조각들
+        self.in_tag = False
 
     def parse(self):
-        text = ""
-        in_tag = False
-        for c in self.body:
-            # <h1>wow</h1> 꼴에서 Text(wow)는 <를 만나면 끝난다.
-            # <h1>wow</h1> 꼴에서 Element(h1)는 >를 만나면 끝난다.
-            if c == "<":
-                in_tag = True
-                if text: self.add_text(text) # <를 만났으므로 여기까지가 Text
-                text = ""
-            elif c == ">":
-                in_tag = False
-                self.add_tag(text) # >를 만났으므로 여기까지가 Tag
-                text = ""
-            else:
-                text += c
-        if not in_tag and text:
+        self.feed(self.body)
+        return self.close()
+
+    def feed(self, chunk):
+        '''
+        body의 일부를 받는 대로 넘겨서 다운로드와 파싱이 겹치도록 한다. 다 넘겼으면 close()로 DOM tree를 받는다.
+        한 글자씩 text += c로 붙이면 긴 문서에서 너무 느리므로 <, >를 기준으로 한 번에 잘라낸다.
+        '''
+        pieces = TAG_DELIMITER.split(chunk) # 'a<b>c' -> ['a', '<', 'b', '>', 'c']
+        tail = pieces.pop() # 마지막 조각은 아직 <나 >를 만나지 못했으므로 다음 chunk를 기다린다.
+        if pieces:
+            if self.parts:
+                self.parts.append(pieces[0])
+                pieces[0] = "".join(self.parts)
+                self.parts = []
+            add_text, add_tag = self.add_text, self.add_tag
+            it = iter(pieces)
+            for text, delimiter in zip(it, it):
+                # <h1>wow</h1> 꼴에서 Text(wow)는 <를 만나면 끝난다.
+                # <h1>wow</h1> 꼴에서 Element(h1)는 >를 만나면 끝난다.
+                if delimiter == "<":
+                    if text: add_text(text) # <를 만났으므로 여기까지가 Text
+                else:
+                    add_tag(text) # >를 만났으므로 여기까지가 Tag
+            self.in_tag = pieces[-1] == "<"
+        if tail:
+            self.parts.append(tail)
+
+    def close(self):
+        text = "".join(self.parts)
+        self.parts = []
+        if not self.in_tag and text:
             self.add_text(text)
         return self.finish()
 
     def get_attributes(self, text):
-        parts = text.split()
+        parts = text.split(None, 1)
         tag = parts[0].lower()
         attributes = {}
-        for attrpair in parts[1:]:
-            if "=" in attrpair:
-                key, value = attrpair.split("=", 1)
-                if len(value) > 2 and value[0] in ["'", "\""]:
-                    value = value[1:-1]
-                attributes[key.lower()] = value
-            else:
-                attributes[attrpair.lower()] = ""
+        if len(parts) == 1: return tag, attributes
+        # 따옴표 안의 공백에서 잘리지 않도록 split 대신 key=value 꼴을 정규식으로 찾는다.
+        for key, value in ATTRIBUTE.findall(parts[1]):
+            if len(value) >= 2 and value[0] in ["'", "\""] and value[-1] == value[0]:
+                value = value[1:-1]
+            attributes[sys.intern(key.lower())] = value
         return tag, attributes
 
     def add_text(self, text):
@@ -78,6 +116,7 @@ class HTMLParser:
     ]
 
     def add_tag(self, tag):
+        if not tag or tag.isspace(): return # '<>'처럼 비어 있는 tag는 무시
         tag, attributes = self.get_attributes(tag)
         if tag.startswith("!"): 
             # <!doctype html>와 같은 special tag나 html 주석 <!-- comment text --> 무시 (원래 브라우저는 다 처리 하는데 우리는 공부용이니 pass)
@@ -105,16 +144,22 @@ class HTMLParser:
     ]
 
     def implicit_tags(self, tag):
+        # 빠뜨린 html, head, body는 열린 태그가 2개 이하일 때만 생기므로, 열린 태그 전체를 훑지 않고 깊이부터 본다.
+        # 한번 body까지 열리고 나면 대부분의 token이 첫 번째 비교에서 끝난다.
         while True:
-            open_tags = [node.tag for node in self.unfinished]
-            if open_tags == [] and tag != "html":
+            depth = len(self.unfinished)
+            if depth > 2:
+                break
+            elif depth == 0 and tag != "html":
                 self.add_tag("html")
-            elif open_tags == ["html"] and tag not in ["head", "body", "/html"]:
+            elif depth == 1 and self.unfinished[0].tag == "html" \
+                    and tag not in ["head", "body", "/html"]:
                 if tag in self.HEAD_TAGS:
                     self.add_tag("head")
                 else:
                     self.add_tag("body")
-            elif open_tags == ["html", "head"] and tag not in ["/head"] + self.HEAD_TAGS:
+            elif depth == 2 and self.unfinished[1].tag == "head" and self.unfinished[0].tag == "html" \
+                    and tag != "/head" and tag not in self.HEAD_TAGS:
                 self.add_tag("/head")
             else:
                 break
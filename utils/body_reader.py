@@ -0,0 +1,124 @@
+import codecs
+import zlib
+
+BLOCK_SIZE = 16 * 1024
+
+def read_body(file, headers):
+    '''
+    response body를 받는 대로 (transfer-encoding 해제 -> content-encoding 해제 -> utf8 decode) 순서로 풀어서 str 조각으로 yield 한다.
+    body 전체를 메모리에 모은 다음 처리하지 않으므로 받는 도중에도 앞부분을 먼저 쓸 수 있다.
+    '''
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        raw = read_chunked(file)
+    elif "content-length" in headers:
+        raw = read_length(file, int(headers["content-length"]))
+    else:
+        raw = read_until_eof(file)
+
+    decoder = codecs.getincrementaldecoder("utf8")()
+    for data in decode_content(raw, headers.get("content-encoding", "identity")):
+        text = decoder.decode(data)
+        if text: yield text
+    text = decoder.decode(b"", final=True)
+    if text: yield text
+
+def read_chunked(file):
+    # '1a2f\r\n<0x1a2f bytes>\r\n ... 0\r\n<trailers>\r\n' 꼴. chunk 크기는 16진수이고 ';' 뒤로는 chunk extension이라 무시한다.
+    while True:
+        line = file.readline()
+        if not line:
+            raise ConnectionResetError("connection closed in chunked body")
+        size = int(line.split(b";", 1)[0].strip(), 16)
+        if size == 0: break
+        yield from read_length(file, size)
+        file.readline() # chunk 뒤에 붙는 \r\n
+    while True:
+        line = file.readline() # trailer header들은 쓰지 않으므로 빈 줄까지 버린다.
+        if line in (b"\r\n", b"\n", b""): break
+
+def read_length(file, length):
+    while length > 0:
+        data = file.read1(min(length, BLOCK_SIZE))
+        if not data:
+            raise ConnectionResetError("connection closed with {} bytes left".format(length))
+        length -= len(data)
+        yield data
+
+def read_until_eof(file):
+    while True:
+        data = file.read1(BLOCK_SIZE)
+        if not data: break
+        yield data
+
+class DeflateDecoder:
+    '''
+    'deflate'는 원래 zlib 포맷이어야 하지만 zlib header 없이 raw deflate를 보내는 서버도 있다.
+    첫 2 byte가 zlib header인지 보고 포맷을 정한다. 첫 조각이 2 byte보다 짧을 수 있으므로 2 byte가 모일 때까지 모아둔다.
+    '''
+    def __init__(self):
+        self.obj = None
+        self.head = b""
+
+    def decompress(self, data):
+        if self.obj is None:
+            self.head += data
+            if len(self.head) < 2: return b""
+            data, self.head = self.head, b""
+            self.obj = zlib.decompressobj() if is_zlib_header(data) else zlib.decompressobj(-zlib.MAX_WBITS)
+        return self.obj.decompress(data)
+
+    def flush(self):
+        if self.obj is None: # 2 byte도 오지 않았으면 raw deflate로 본다.
+            self.obj = zlib.decompressobj(-zlib.MAX_WBITS)
+            return self.obj.decompress(self.head) + self.obj.flush()
+        return self.obj.flush()
+
+def is_zlib_header(head):
+    # CMF의 아래 4 bit가 8(deflate)이고, CMF * 256 + FLG가 31의 배수여야 한다. (RFC 1950)
+    return head[0] & 0x0f == 8 and (head[0] * 256 + head[1]) % 31 == 0
+
+def decompressor(coding):
+    if coding in ("gzip", "x-gzip"):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS) # 16 + MAX_WBITS는 gzip header/trailer를 기대하라는 뜻
+    elif coding == "deflate":
+        return DeflateDecoder()
+    assert coding == "identity", "unsupported content-encoding: {}".format(coding)
+    return None
+
+def decode_content(raw, content_encoding):
+    # 'gzip, deflate'처럼 여러 개가 적용돼 있으면 적용된 반대 순서로 풀어야 한다.
+    codings = [coding.strip().lower() for coding in content_encoding.split(",")]
+    decoders = [decompressor(coding) for coding in reversed(codings) if coding]
+    decoders = [decoder for decoder in decoders if decoder]
+
+    for data in raw:
+        for decoder in decoders:
+            data = decoder.decompress(data)
+        if data: yield data
+
+    # 각 단계에 남아 있는 데이터를 밀어낸다. 앞 단계의 flush 결과도 뒤 단계를 거쳐야 한다.
+    data = b""
+    for decoder in decoders:
+        data = decoder.decompress(data) + decoder.flush()
+    if data: yield data
+
+def check_deflate():
+    '''
+    zlib 포맷과 raw deflate를 여러 크기의 조각(1 byte씩 포함)으로 나눠 넣어도 원래 body가 나오는지 확인한다.
+    python3 -m utils.body_reader
+    '''
+    body = ("<p>deflate body " * 200).encode("utf8")
+    raw = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    encoded = {"zlib": zlib.compress(body), "raw": raw.compress(body) + raw.flush()}
+    for name, data in encoded.items():
+        for size in [1, 2, 3, 7, len(data)]:
+            pieces = [data[i:i + size] for i in range(0, len(data), size)]
+            decoded = b"".join(decode_content(iter(pieces), "deflate"))
+            assert decoded == body, "{} deflate split into {} byte pieces".format(name, size)
+        # 첫 조각만 1 byte인 경우 (chunked 응답의 첫 chunk가 짧을 때)
+        decoded = b"".join(decode_content(iter([data[:1], data[1:]]), "deflate"))
+        assert decoded == body, "{} deflate with a 1 byte first piece".format(name)
+    print("deflate ok")
+
+if __name__ == "__main__":
+    check_deflate()
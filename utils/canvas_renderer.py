@@ -0,0 +1,100 @@
+import time
+from bisect import bisect_right
+from collections import deque
+
+class CanvasRenderer:
+    '''
+    스크롤할 때마다 canvas.delete("all") 후 화면의 명령을 전부 다시 만들지 않고, 만든 canvas item을 살려둔 채 canvas.move로 옮긴다.
+    화면 위아래로 overscan(px)만큼 넓힌 band 안의 명령만 item으로 만들어 두고,
+    화면이 band를 벗어났을 때만 band를 다시 잡아 새로 들어온 명령의 item을 만들고 band를 벗어난 item을 지운다.
+
+    명령의 execute(scroll, canvas)는 만든 canvas item의 id를 돌려줘야 하고, place(item, scroll, canvas)는 그 item을 명령의 지금 좌표로 옮긴다.
+    '''
+    def __init__(self, canvas, overscan=600):
+        self.canvas = canvas
+        self.overscan = overscan
+        self.display_index = None
+        self.items = {} # display_list에서의 위치 -> canvas item id
+        self.scroll = 0 # 지금 canvas item들이 놓인 기준 scroll
+        self.band = None # item을 만들어 둔 문서 좌표 범위 (y0, y1)
+
+        self.frames = 0
+        self.created = 0
+        self.deleted = 0
+        self.frame_times = deque(maxlen=120) # 최근 frame들의 (draw 시간(ms), 만든 item 수, 지운 item 수)
+
+    def reset(self, display_index):
+        # 새로 paint한 display_list로 바꾼다. 이전 item들은 위치가 더는 맞지 않으므로 모두 지운다.
+        self.canvas.delete("all")
+        self.deleted += len(self.items)
+        self.items = {}
+        self.band = None
+        self.display_index = display_index
+
+    def refresh(self, display_index, changed):
+        '''
+        display_list의 명령 일부가 제자리에서 바뀌었을 때 reset 대신 쓴다. changed는 바뀐 명령 위치의 범위 [(start, end), ...]다.
+        만들어 둔 item 중 바뀐 명령의 item만 새 좌표로 옮기고, band는 다음 render에서 다시 잡는다. 옮긴 item 수를 돌려준다.
+        '''
+        self.display_index = display_index
+        display_list = display_index.display_list
+        starts = [start for start, end in changed]
+        placed = 0
+        for i, item in self.items.items():
+            k = bisect_right(starts, i) - 1
+            if k >= 0 and i < changed[k][1]:
+                display_list[i].place(item, self.scroll, self.canvas)
+                placed += 1
+        self.band = None
+        return placed
+
+    def render(self, scroll, height):
+        start = time.perf_counter()
+        if scroll != self.scroll:
+            self.canvas.move("all", 0, self.scroll - scroll)
+            self.scroll = scroll
+
+        created = deleted = 0
+        if self.band is None or scroll < self.band[0] or scroll + height > self.band[1]:
+            self.band = (scroll - self.overscan, scroll + height + self.overscan)
+            created, deleted = self.update_items(*self.band)
+
+        self.frames += 1
+        self.created += created
+        self.deleted += deleted
+        self.frame_times.append(((time.perf_counter() - start) * 1000, created, deleted))
+
+    def update_items(self, y0, y1):
+        wanted = self.display_index.indices(y0, y1)
+        wanted_set = set(wanted)
+        leaving = [i for i in self.items if i not in wanted_set]
+        for i in leaving:
+            self.canvas.delete(self.items.pop(i))
+
+        display_list = self.display_index.display_list
+        live = sorted(self.items)
+        entering = [i for i in wanted if i not in self.items]
+        for i in entering:
+            item = display_list[i].execute(self.scroll, self.canvas)
+            # 새 item은 맨 위에 쌓이므로, 그리는 순서상 뒤에 오는 item이 이미 있으면 그 아래로 내려서 겹치는 순서를 지킨다.
+            after = bisect_right(live, i)
+            if after < len(live):
+                self.canvas.tag_lower(item, self.items[live[after]])
+            self.items[i] = item
+        return len(entering), len(leaving)
+
+    def stats(self):
+        times = [ms for ms, created, deleted in self.frame_times]
+        return {
+            "frames": self.frames,
+            "items": len(self.items),
+            "created": self.created,
+            "deleted": self.deleted,
+            "last_frame_ms": times[-1] if times else 0,
+            "mean_frame_ms": sum(times) / len(times) if times else 0,
+            "max_frame_ms": max(times) if times else 0,
+        }
+
+    def __repr__(self):
+        return "CanvasRenderer(frames={}, items={}, created={}, deleted={})".format(
+            self.frames, len(self.items), self.created, self.deleted)
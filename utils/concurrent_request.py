@@ -0,0 +1,30 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.parse_url import parse_url
+from utils.url_request import request
+
+def request_all(urls, max_per_host=6, max_workers=16, keep_alive=True, use_cache=False):
+    '''
+    여러 url을 thread pool에서 동시에 요청하고, 결과는 urls와 같은 순서의 list로 돌려준다.
+    stylesheet는 문서에 나온 순서대로 cascade에 들어가야 하므로 먼저 도착한 순서가 아니라 요청한 순서를 지킨다.
+    한 host에 동시에 열리는 요청은 max_per_host개로 제한한다. (브라우저들도 host당 6개 정도로 제한한다)
+    실패한 요청의 자리에는 None이 들어간다.
+    '''
+    if not urls: return []
+
+    semaphores = {}
+    lock = threading.Lock()
+
+    def fetch(url):
+        try:
+            scheme, host, port, path = parse_url(url)
+            with lock:
+                semaphore = semaphores.setdefault((scheme, host, port), threading.Semaphore(max_per_host))
+            with semaphore:
+                return request(url, keep_alive=keep_alive, use_cache=use_cache)
+        except Exception:
+            return None
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(urls))) as executor:
+        return list(executor.map(fetch, urls))
@@ -0,0 +1,91 @@
+import threading
+import time
+
+class Connection:
+    '''
+    pool에 담기는 단위. socket과 그 socket에서 읽어들이는 buffered file을 함께 들고 다닌다.
+    같은 socket에 makefile을 여러 번 하면 앞선 file의 buffer에 남은 byte를 잃을 수 있으므로 file도 재사용한다.
+    '''
+    def __init__(self, key, sock):
+        self.key = key # (scheme, host, port)
+        self.sock = sock
+        self.file = sock.makefile("rb")
+        self.last_used = time.monotonic()
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+    def __repr__(self):
+        return "Connection(key={})".format(self.key)
+
+class ConnectionPool:
+    '''
+    HTTP/1.1 keep-alive를 위해 (scheme, host, port) 별로 idle connection을 모아두고 재사용합니다.
+    같은 host에서 page와 stylesheet를 받아올 때 TCP connect와 TLS handshake를 다시 하지 않아도 된다.
+    '''
+    def __init__(self, max_idle_time=30, max_per_host=6, max_size=32):
+        self.max_idle_time = max_idle_time # 이 시간(초) 넘게 놀고 있던 connection은 서버가 이미 닫았을 가능성이 높으므로 버린다.
+        self.max_per_host = max_per_host
+        self.max_size = max_size
+        self.idle = {} # key -> [Connection], 마지막에 반납된 것이 끝에 온다.
+        self.hits = 0 # 재사용에 성공한 횟수 == 아낀 connect(+handshake) 횟수
+        self.misses = 0 # 새로 connect 해야 했던 횟수
+        self.lock = threading.Lock() # subresource를 여러 thread에서 동시에 받아오므로
+
+    def get(self, key):
+        with self.lock:
+            conns = self.idle.get(key, [])
+            now = time.monotonic()
+            while conns:
+                conn = conns.pop()
+                if now - conn.last_used <= self.max_idle_time:
+                    return conn
+                conn.close()
+            return None
+
+    def put(self, conn):
+        with self.lock:
+            conns = self.idle.setdefault(conn.key, [])
+            if len(conns) >= self.max_per_host:
+                conn.close()
+                return
+            if self.size() >= self.max_size:
+                self.evict_oldest()
+            conn.last_used = time.monotonic()
+            conns.append(conn)
+
+    def evict_oldest(self):
+        oldest = None
+        for conns in self.idle.values():
+            if conns and (oldest is None or conns[0].last_used < oldest.last_used):
+                oldest = conns[0]
+        if oldest:
+            self.idle[oldest.key].remove(oldest)
+            oldest.close()
+
+    def record(self, reused):
+        with self.lock:
+            if reused:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def size(self):
+        return sum(len(conns) for conns in self.idle.values())
+
+    def close_all(self):
+        with self.lock:
+            for conns in self.idle.values():
+                for conn in conns:
+                    conn.close()
+            self.idle = {}
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "idle": self.size()}
+
+    def __repr__(self):
+        return "ConnectionPool(hits={}, misses={}, idle={})".format(
+            self.hits, self.misses, self.size())
+
+POOL = ConnectionPool()
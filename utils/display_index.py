@@ -0,0 +1,51 @@
+from bisect import bisect_left, bisect_right
+
+class DisplayIndex:
+    '''
+    display_list를 top 기준으로 정렬해두고, 화면에 걸치는 명령만 bisect로 찾는다.
+    스크롤할 때마다 display_list 전체를 훑지 않으므로 비용이 문서 길이가 아니라 화면에 보이는 명령 수에 비례한다.
+
+    top만으로 정렬하면 위에서 시작해 아래로 길게 늘어진 명령(ex. 배경 DrawRect)을 놓친다.
+    그래서 높이가 max_height 이하인 명령만 정렬해두고, bottom >= y0인 명령은 top >= y0 - max_height이므로 거기서부터 찾는다.
+    max_height보다 긴 명령(ex. 문서 전체 높이의 배경)은 몇 개 되지 않으므로 tall에 따로 두고 매번 모두 본다.
+    max_height는 화면 높이 정도로 잡는다. 너무 작으면 tall이 커지고, 너무 크면 화면 위쪽에서 더 많이 훑는다.
+
+    명령마다 view를 만들지 않도록 display_list(DisplayList)의 tops, bottoms column을 바로 읽는다.
+    '''
+    def __init__(self, display_list, max_height=600):
+        tops, bottoms = display_list.tops, display_list.bottoms
+        short = []
+        self.tall = [] # max_height보다 긴 명령들의 display_list에서의 위치 (오름차순)
+        for i in range(len(display_list)):
+            if bottoms[i] - tops[i] > max_height:
+                self.tall.append(i)
+            else:
+                short.append(i)
+        order = sorted(short, key=tops.__getitem__)
+        self.display_list = display_list
+        self.max_height = max_height
+        self.bottoms = bottoms
+        self.order = order # top 순서 -> display_list에서의 위치
+        self.tops = [tops[i] for i in order]
+
+    def indices(self, y0, y1):
+        '''
+        y0 <= bottom이고 top <= y1인 명령들의 display_list에서의 위치를 오름차순으로(그리는 순서대로) 돌려준다.
+        '''
+        start = bisect_left(self.tops, y0 - self.max_height)
+        end = bisect_right(self.tops, y1)
+        tops, bottoms = self.display_list.tops, self.bottoms
+        visible = [i for i in self.order[start:end] if bottoms[i] >= y0]
+        visible.extend(i for i in self.tall if tops[i] <= y1 and bottoms[i] >= y0)
+        visible.sort()
+        return visible
+
+    def query(self, y0, y1):
+        display_list = self.display_list
+        return [display_list[i] for i in self.indices(y0, y1)]
+
+    def __len__(self):
+        return len(self.display_list)
+
+    def __repr__(self):
+        return "DisplayIndex(commands={}, tall={})".format(len(self.display_list), len(self.tall))
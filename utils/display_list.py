@@ -0,0 +1,225 @@
+'''
+display_list를 명령마다 Python 객체를 두지 않고, 열(column)마다 array 하나씩 두는 꼴(struct of arrays)로 담는다.
+긴 문서에서는 단어 하나마다 DrawText가 하나씩 생겨 수십만 개가 되므로, 좌표는 array('d')에, font/color/글자는 표의 번호로만 들고 있는다.
+DrawText/DrawRect는 (display_list, 번호)만 가진 가벼운 view라서 필요할 때만 만들었다가 버린다.
+
+save()로 파일에 쓰고 load()로 mmap해서 열면 좌표 column들은 heap에 올리지 않고 파일을 그대로 읽는다.
+'''
+import json
+import mmap
+import sys
+from array import array
+
+TEXT, RECT = 0, 1
+MAGIC = b"PWBDL1\0\0"
+COLUMNS = [ # (이름, typecode)
+    ("kinds", "b"),
+    ("lefts", "d"), ("tops", "d"), ("rights", "d"), ("bottoms", "d"),
+    ("fonts", "i"), ("colors", "i"), ("texts", "i"),
+]
+
+class DrawText:
+    __slots__ = ("display_list", "index")
+
+    def __init__(self, display_list, index):
+        self.display_list = display_list
+        self.index = index
+
+    @property
+    def top(self): return self.display_list.tops[self.index]
+    @property
+    def left(self): return self.display_list.lefts[self.index]
+    @property
+    def bottom(self): return self.display_list.bottoms[self.index]
+    @property
+    def text(self): return self.display_list.strings[self.display_list.texts[self.index]]
+    @property
+    def font(self): return self.display_list.font_table[self.display_list.fonts[self.index]]
+    @property
+    def color(self): return self.display_list.color_table[self.display_list.colors[self.index]]
+
+    def execute(self, scroll, canvas):
+        return canvas.create_text(
+            self.left, self.top - scroll,
+            text=self.text,
+            font=self.font.canvas_font,
+            anchor='nw',
+            fill=self.color,
+        )
+
+    def place(self, item, scroll, canvas):
+        # execute로 만든 item을 지금 좌표로 옮긴다.
+        canvas.coords(item, self.left, self.top - scroll)
+
+    def __repr__(self):
+        return "DrawText(text={})".format(self.text)
+
+class DrawRect:
+    __slots__ = ("display_list", "index")
+
+    def __init__(self, display_list, index):
+        self.display_list = display_list
+        self.index = index
+
+    @property
+    def top(self): return self.display_list.tops[self.index]
+    @property
+    def left(self): return self.display_list.lefts[self.index]
+    @property
+    def bottom(self): return self.display_list.bottoms[self.index]
+    @property
+    def right(self): return self.display_list.rights[self.index]
+    @property
+    def color(self): return self.display_list.color_table[self.display_list.colors[self.index]]
+
+    def execute(self, scroll, canvas):
+        return canvas.create_rectangle(
+            self.left, self.top - scroll,
+            self.right, self.bottom - scroll,
+            width=0,
+            fill=self.color,
+        )
+
+    def place(self, item, scroll, canvas):
+        canvas.coords(item, self.left, self.top - scroll, self.right, self.bottom - scroll)
+
+    def __repr__(self):
+        return "DrawRect(top={} left={} bottom={} right={} color={})".format(
+            self.top, self.left, self.bottom, self.right, self.color)
+
+VIEWS = {TEXT: DrawText, RECT: DrawRect}
+
+class Table:
+    # 같은 값은 한 번만 담고 번호로 가리킨다. (font, color, 단어)
+    def __init__(self, values=()):
+        self.values = list(values)
+        self.numbers = {value: i for i, value in enumerate(self.values)}
+
+    def number(self, value):
+        number = self.numbers.get(value)
+        if number is None:
+            number = self.numbers[value] = len(self.values)
+            self.values.append(value)
+        return number
+
+    def __getitem__(self, number):
+        return self.values[number]
+
+    def __len__(self):
+        return len(self.values)
+
+class DisplayList:
+    def __init__(self):
+        for name, typecode in COLUMNS:
+            setattr(self, name, array(typecode))
+        self.font_table = Table()
+        self.color_table = Table()
+        self.strings = Table()
+        self.mapped = None # load()로 연 경우의 mmap
+
+    def add_text(self, x, y, text, font, color):
+        self.append(TEXT, x, y, x, y + font.linespace,
+                    self.font_table.number(font), self.color_table.number(color), self.strings.number(text))
+
+    def add_rect(self, x1, y1, x2, y2, color):
+        self.append(RECT, x1, y1, x2, y2, -1, self.color_table.number(color), -1)
+
+    def append(self, kind, left, top, right, bottom, font, color, text):
+        self.kinds.append(kind)
+        self.lefts.append(left)
+        self.tops.append(top)
+        self.rights.append(right)
+        self.bottoms.append(bottom)
+        self.fonts.append(font)
+        self.colors.append(color)
+        self.texts.append(text)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, i):
+        if i < 0: i += len(self)
+        if not 0 <= i < len(self): raise IndexError("display list index out of range")
+        return VIEWS[self.kinds[i]](self, i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield VIEWS[self.kinds[i]](self, i)
+
+    def nbytes(self):
+        # column들이 차지하는 byte 수 (표는 제외)
+        return sum(len(column) * column.itemsize for column in self.columns())
+
+    def columns(self):
+        return [getattr(self, name) for name, typecode in COLUMNS]
+
+    def save(self, path):
+        '''
+        font는 font.key로, 나머지 표는 json으로 header에 쓰고, 그 뒤에 column들의 byte를 8 byte 경계에 맞춰 이어 쓴다.
+        '''
+        offsets = []
+        offset = 0
+        for column in self.columns():
+            offsets.append(offset)
+            offset += -(-len(column) * column.itemsize // 8) * 8
+        header = json.dumps({
+            "count": len(self),
+            "byteorder": sys.byteorder,
+            "itemsizes": [column.itemsize for column in self.columns()],
+            "offsets": offsets,
+            "fonts": [list(font.key) for font in self.font_table.values],
+            "colors": self.color_table.values,
+            "strings": self.strings.values,
+        }).encode("utf8")
+        header += b" " * (-len(header) % 8)
+        with open(path, "wb") as f:
+            f.write(MAGIC)
+            f.write(len(header).to_bytes(8, "little"))
+            f.write(header)
+            for column in self.columns():
+                data = column.tobytes()
+                f.write(data)
+                f.write(b"\0" * (-len(data) % 8))
+
+    @classmethod
+    def load(cls, path, font_loader):
+        '''
+        save()한 파일을 mmap해서 연다. column들은 파일을 가리키는 읽기 전용 memoryview라 더 추가할 수 없다.
+        font_loader(key)는 font.key로 font를 다시 만든다. ex) lambda key: get_font(*key[1:])
+        '''
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mapped[:len(MAGIC)] != MAGIC:
+            mapped.close()
+            raise ValueError("{} is not a display list file".format(path))
+        header_size = int.from_bytes(mapped[8:16], "little")
+        header = json.loads(mapped[16:16 + header_size].decode("utf8"))
+        itemsizes = [array(typecode).itemsize for name, typecode in COLUMNS]
+        if header["byteorder"] != sys.byteorder or header["itemsizes"] != itemsizes:
+            mapped.close()
+            raise ValueError("{} was saved on an incompatible platform".format(path))
+
+        display_list = cls()
+        display_list.mapped = mapped
+        view = memoryview(mapped)
+        base = 16 + header_size
+        count = header["count"]
+        for (name, typecode), itemsize, offset in zip(COLUMNS, itemsizes, header["offsets"]):
+            start = base + offset
+            setattr(display_list, name, view[start:start + count * itemsize].cast(typecode))
+        display_list.font_table = Table(font_loader(tuple(key)) for key in header["fonts"])
+        display_list.color_table = Table(header["colors"])
+        display_list.strings = Table(header["strings"])
+        return display_list
+
+    def close(self):
+        if self.mapped is None: return
+        for name, typecode in COLUMNS:
+            getattr(self, name).release()
+            setattr(self, name, array(typecode))
+        self.mapped.close()
+        self.mapped = None
+
+    def __repr__(self):
+        return "DisplayList(commands={}, fonts={}, colors={}, strings={}, bytes={})".format(
+            len(self), len(self.font_table), len(self.color_table), len(self.strings), self.nbytes())
@@ -0,0 +1,45 @@
+import socket
+import threading
+import time
+
+class Resolver:
+    '''
+    host 이름을 주소로 바꾼 결과를 ttl(초) 동안 process 전체에서 공유합니다.
+    getaddrinfo는 DNS 응답의 TTL을 알려주지 않으므로 고정된 ttl을 쓴다.
+    '''
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self.entries = {} # (host, port) -> (expires_at, address)
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def resolve(self, host, port):
+        key = (host, port)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        # 느린 DNS 조회 중에 다른 thread를 막지 않도록 lock 밖에서 조회한다.
+        infos = socket.getaddrinfo(host, port, socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+        address = infos[0][4]
+        with self.lock:
+            self.entries[key] = (now + self.ttl, address)
+        return address
+
+    def forget(self, host, port):
+        # 캐시된 주소로 connect가 실패하면 다음에는 다시 조회하도록 지운다.
+        with self.lock:
+            self.entries.pop((host, port), None)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
+
+    def __repr__(self):
+        return "Resolver(hits={}, misses={}, entries={})".format(
+            self.hits, self.misses, len(self.entries))
+
+RESOLVER = Resolver()
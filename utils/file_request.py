@@ -0,0 +1,52 @@
+import codecs
+import mimetypes
+import mmap
+import os
+import time
+from urllib.parse import unquote
+
+from utils import trace
+
+BLOCK_SIZE = 256 * 1024 # 네트워크와 달리 기다릴 일이 없으므로 parser에 한 번에 크게 넘긴다.
+
+def file_path(host, path):
+    # file:///home/a.html, file://localhost/home/a.html -> /home/a.html
+    if host not in ("", "localhost"):
+        raise ValueError("file url with a remote host: {}".format(host))
+    return unquote(path)
+
+def file_stream(url, host, path):
+    '''
+    로컬 파일을 mmap해서 (headers, str 조각 generator)로 돌려준다. request_stream과 같은 꼴이다.
+    파일 전체를 읽어 들이지 않고 page cache를 그대로 보며, parser가 조각을 가져갈 때마다 그만큼만 utf8로 decode한다.
+    '''
+    start = time.perf_counter()
+    filename = file_path(host, path)
+    f = open(filename, "rb")
+    try:
+        size = os.fstat(f.fileno()).st_size
+        # 빈 파일은 mmap할 수 없다.
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+    finally:
+        f.close() # mmap은 file descriptor를 따로 들고 있으므로 파일은 바로 닫아도 된다.
+    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    headers = {"content-length": str(size), "content-type": content_type}
+    return headers, decode_mapped(url, mapped, start)
+
+def decode_mapped(url, mapped, start):
+    decoder = codecs.getincrementaldecoder("utf8")()
+    try:
+        if mapped is not None:
+            view = memoryview(mapped)
+            try:
+                for offset in range(0, len(view), BLOCK_SIZE):
+                    # utf8 글자가 조각 경계에서 잘려도 incremental decoder가 다음 조각과 이어 붙인다.
+                    text = decoder.decode(view[offset:offset + BLOCK_SIZE])
+                    if text: yield text
+            finally:
+                view.release()
+        text = decoder.decode(b"", final=True)
+        if text: yield text
+    finally:
+        if mapped is not None: mapped.close()
+    trace.complete("request", trace.to_us(start), trace.now_us(), url=url, file=True)
@@ -0,0 +1,136 @@
+'''
+layout이 글자 폭과 높이를 어디서 얻을지 고르는 metrics backend.
+
+backend는 다음 네 가지를 제공한다.
+- create_font(size, weight, slant): backend가 쓰는 font 객체(handle)를 만든다.
+- measure(handle, text): text의 폭(px)
+- metrics(handle): (ascent, descent, linespace)
+- canvas_font(handle): tkinter canvas의 font 인자로 넘길 값
+
+TkMetrics는 실제 Tk font로 재므로 Tk interpreter(와 display)가 있어야 한다.
+TableMetrics는 미리 만들어둔 글자별 advance 표(font_metrics.json)로 계산하므로 Tk 없이, worker process나 display 없는 서버에서도 돈다.
+'''
+import json
+import os
+import sys
+import unicodedata
+
+TABLE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "font_metrics.json")
+
+class TkMetrics:
+    name = "tk"
+
+    def create_font(self, size, weight, slant):
+        import tkinter.font
+        return tkinter.font.Font(size=size, weight=weight, slant=slant)
+
+    def measure(self, font, text):
+        return font.measure(text)
+
+    def metrics(self, font):
+        metrics = font.metrics()
+        return metrics["ascent"], metrics["descent"], metrics["linespace"]
+
+    def canvas_font(self, font):
+        return font
+
+class TableFont:
+    def __init__(self, family, size, weight, slant, pixel_size, advances):
+        self.family = family
+        self.size = size
+        self.weight = weight
+        self.slant = slant
+        self.pixel_size = pixel_size
+        self.advances = advances # 글자 -> em 단위 advance
+
+    def __repr__(self):
+        return "TableFont(family={}, size={}, weight={}, slant={})".format(
+            self.family, self.size, self.weight, self.slant)
+
+class TableMetrics:
+    '''
+    font_metrics.json의 글자별 advance 표로 폭을 계산한다. kerning은 고려하지 않는다.
+    표에 없는 글자는 default_advance, 한글/한자처럼 전각인 글자는 wide_advance로 본다.
+    '''
+    name = "table"
+
+    def __init__(self, path=TABLE_PATH):
+        with open(path, encoding="utf8") as f:
+            table = json.load(f)
+        self.family = table["family"]
+        self.units_per_em = table["units_per_em"]
+        self.pixels_per_point = table["pixels_per_point"]
+        self.ascent = table["ascent"]
+        self.descent = table["descent"]
+        self.default_advance = table["default_advance"]
+        self.wide_advance = table["wide_advance"]
+        self.advances = table["advances"] # weight -> {글자: advance}
+
+    def create_font(self, size, weight, slant):
+        # tkinter와 마찬가지로 양수 size는 point, 음수 size는 pixel이다.
+        pixel_size = size * self.pixels_per_point if size > 0 else -size
+        advances = self.advances.get(weight, self.advances["normal"])
+        return TableFont(self.family, size, weight, slant, pixel_size, advances)
+
+    def advance(self, font, c):
+        advance = font.advances.get(c)
+        if advance is None:
+            if unicodedata.east_asian_width(c) in ("W", "F"):
+                advance = self.wide_advance
+            else:
+                advance = self.default_advance
+        return advance
+
+    def measure(self, font, text):
+        units = sum([self.advance(font, c) for c in text])
+        return round(units * font.pixel_size / self.units_per_em)
+
+    def metrics(self, font):
+        ascent = round(self.ascent * font.pixel_size / self.units_per_em)
+        descent = round(self.descent * font.pixel_size / self.units_per_em)
+        return ascent, descent, ascent + descent
+
+    def canvas_font(self, font):
+        # Tk가 있는 곳에서 그릴 때는 font description tuple을 그대로 canvas에 넘길 수 있다.
+        return (font.family, font.size, font.weight, font.slant)
+
+BACKEND = TkMetrics()
+
+def get_backend():
+    return BACKEND
+
+def use_backend(backend):
+    '''
+    이후에 만드는 font부터 backend를 바꾼다. ex) use_backend(TableMetrics())
+    '''
+    global BACKEND
+    BACKEND = backend
+
+def dump_tk_table(path, family=None):
+    '''
+    이 컴퓨터의 Tk font로 ASCII 글자들의 advance를 재서 TableMetrics가 읽을 표를 만든다. (display가 필요하다)
+    -1000 pixel 크기로 재면 px 값이 곧 1000 units per em 기준의 advance가 된다.
+    '''
+    import tkinter
+    import tkinter.font
+    root = tkinter.Tk()
+    root.withdraw()
+    table = {"units_per_em": 1000, "pixels_per_point": float(root.tk.call("tk", "scaling")),
+             "wide_advance": 1000, "advances": {}}
+    for weight in ["normal", "bold"]:
+        font = tkinter.font.Font(family=family, size=-1000, weight=weight) if family \
+            else tkinter.font.Font(size=-1000, weight=weight)
+        table["family"] = font.actual("family")
+        table["advances"][weight] = {chr(c): font.measure(chr(c)) for c in range(32, 127)}
+        if weight == "normal":
+            table["ascent"] = font.metrics("ascent")
+            table["descent"] = font.metrics("descent")
+            table["default_advance"] = font.measure("n")
+    table["source"] = "measured with Tk {} on {}".format(tkinter.TkVersion, sys.platform)
+    root.destroy()
+    with open(path, "w", encoding="utf8") as f:
+        json.dump(table, f, indent=1, ensure_ascii=False)
+        f.write("\n")
+
+if __name__ == "__main__":
+    dump_tk_table(sys.argv[1] if len(sys.argv) > 1 else TABLE_PATH)
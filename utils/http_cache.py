@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "py-web-browser", "http")
+
+# body는 decode된 str로 저장하므로 전송 과정에만 의미가 있는 header는 버린다.
+HOP_BY_HOP_HEADERS = [
+    "connection", "keep-alive", "transfer-encoding", "content-encoding", "content-length",
+]
+
+def parse_cache_control(value):
+    '''
+    'max-age=60, no-cache' -> {"max-age": "60", "no-cache": None}
+    '''
+    directives = {}
+    for part in value.split(","):
+        part = part.strip()
+        if not part: continue
+        if "=" in part:
+            key, val = part.split("=", 1)
+            directives[key.strip().lower()] = val.strip().strip('"')
+        else:
+            directives[part.lower()] = None
+    return directives
+
+def parse_http_date(value):
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+def is_storable(headers):
+    directives = parse_cache_control(headers.get("cache-control", ""))
+    if "no-store" in directives: return False
+    if headers.get("vary", "").strip() == "*": return False
+    # 신선도 정보도, 재검증할 validator도 없으면 저장해봐야 쓸 일이 없다.
+    return freshness_lifetime(headers) > 0 \
+        or "etag" in headers or "last-modified" in headers
+
+def freshness_lifetime(headers):
+    directives = parse_cache_control(headers.get("cache-control", ""))
+    if "no-cache" in directives: return 0
+    if "max-age" in directives:
+        try:
+            return max(int(directives["max-age"]), 0)
+        except ValueError:
+            return 0
+    if "expires" in headers:
+        expires = parse_http_date(headers["expires"])
+        if expires is None: return 0 # 'Expires: 0'처럼 잘못된 값은 이미 만료된 것으로 본다.
+        date = parse_http_date(headers.get("date", "")) or time.time()
+        return max(expires - date, 0)
+    return 0
+
+class CacheEntry:
+    def __init__(self, url, headers, body, stored_at):
+        self.url = url
+        self.headers = headers
+        self.body = body
+        self.stored_at = stored_at
+
+    def age(self):
+        try:
+            initial_age = int(self.headers.get("age", "0"))
+        except ValueError:
+            initial_age = 0
+        return initial_age + time.time() - self.stored_at
+
+    def is_fresh(self):
+        return self.age() < freshness_lifetime(self.headers)
+
+    def validators(self):
+        # 재검증 요청에 붙일 header. 서버가 바뀐 게 없으면 body 없이 304를 돌려준다.
+        validators = {}
+        if "etag" in self.headers:
+            validators["If-None-Match"] = self.headers["etag"]
+        if "last-modified" in self.headers:
+            validators["If-Modified-Since"] = self.headers["last-modified"]
+        return validators
+
+    def updated(self, headers):
+        # 304 응답의 header로 저장된 header를 갱신한다. (Date, Cache-Control, ETag 등이 새로 올 수 있다)
+        merged = dict(self.headers)
+        merged.update(without_hop_by_hop(headers))
+        merged.pop("age", None)
+        return CacheEntry(self.url, merged, self.body, time.time())
+
+    def __repr__(self):
+        return "CacheEntry(url={}, age={:.0f}, fresh={})".format(
+            self.url, self.age(), self.is_fresh())
+
+def without_hop_by_hop(headers):
+    return {k: v for k, v in headers.items() if k not in HOP_BY_HOP_HEADERS}
+
+class HTTPCache:
+    '''
+    response header와 body를 url 별로 하나의 json 파일에 담아 디스크에 저장한다.
+    전체 크기가 max_size(byte)를 넘으면 가장 오래 쓰이지 않은 entry부터 지운다. (LRU)
+    '''
+    def __init__(self, directory=CACHE_DIR, max_size=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+        self.index = None # filename -> size. 가장 최근에 쓰인 것이 끝에 온다. 처음 쓸 때 디렉토리를 훑어서 채운다.
+        self.total_size = 0
+        self.hits = 0 # 네트워크 없이 돌려준 횟수
+        self.revalidations = 0 # 304로 body 전송을 아낀 횟수
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def filename(self, url):
+        return hashlib.sha256(url.encode("utf8")).hexdigest() + ".json"
+
+    def load_index(self):
+        if self.index is not None: return
+        self.index = OrderedDict()
+        self.total_size = 0
+        if not os.path.isdir(self.directory): return
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"): continue
+            stat = os.stat(os.path.join(self.directory, name))
+            entries.append((stat.st_mtime, name, stat.st_size))
+        for mtime, name, size in sorted(entries):
+            self.index[name] = size
+            self.total_size += size
+
+    def get(self, url):
+        with self.lock:
+            self.load_index()
+            name = self.filename(url)
+            if name not in self.index: return None
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, encoding="utf8") as f:
+                    data = json.load(f)
+                os.utime(path) # mtime을 마지막 사용 시각으로 써서 재시작 후에도 LRU 순서를 유지한다.
+            except (OSError, ValueError):
+                self.remove(name)
+                return None
+            self.index.move_to_end(name)
+            return CacheEntry(data["url"], data["headers"], data["body"], data["stored_at"])
+
+    def put(self, entry):
+        data = json.dumps({
+            "url": entry.url,
+            "headers": entry.headers,
+            "body": entry.body,
+            "stored_at": entry.stored_at,
+        }).encode("utf8")
+        with self.lock:
+            self.load_index()
+            if len(data) > self.max_size: return
+            os.makedirs(self.directory, exist_ok=True)
+            name = self.filename(entry.url)
+            path = os.path.join(self.directory, name)
+            tmp = "{}.{}.tmp".format(path, threading.get_ident())
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path) # 쓰는 도중에 죽어도 반쯤 쓰인 파일을 읽지 않도록
+            self.total_size += len(data) - self.index.pop(name, 0)
+            self.index[name] = len(data)
+            while self.total_size > self.max_size:
+                self.remove(next(iter(self.index)))
+
+    def delete(self, url):
+        with self.lock:
+            self.load_index()
+            name = self.filename(url)
+            if name in self.index:
+                self.remove(name)
+
+    def remove(self, name):
+        self.total_size -= self.index.pop(name, 0)
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            pass
+
+    def record(self, outcome):
+        # outcome은 "hits", "revalidations", "misses" 중 하나
+        with self.lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def stats(self):
+        return {"hits": self.hits, "revalidations": self.revalidations,
+                "misses": self.misses, "size": self.total_size}
+
+    def __repr__(self):
+        return "HTTPCache(hits={}, revalidations={}, misses={}, size={})".format(
+            self.hits, self.revalidations, self.misses, self.total_size)
+
+CACHE = HTTPCache()
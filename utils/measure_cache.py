@@ -0,0 +1,80 @@
+import threading
+from collections import OrderedDict
+
+from utils import trace
+
+class MeasureCache:
+    '''
+    font.measure(word)는 매번 Tcl/Tk를 거치므로 layout에서 가장 비싼 호출이다.
+    실제 문서에서는 같은 단어가 아주 많이 반복되므로 (font key, word) -> 폭을 max_size개까지 기억해둔다. (LRU)
+    공백 폭은 font마다 한 번만 잰다.
+    '''
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self.widths = OrderedDict() # (font key, word) -> width
+        self.spaces = {} # font key -> width of " "
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def space_width(self, font_key, font):
+        if font_key not in self.spaces:
+            self.spaces[font_key] = font.measure(" ")
+        return self.spaces[font_key]
+
+    def measure(self, font_key, font, word):
+        return self.measure_words(font_key, font, [word])[word]
+
+    def measure_words(self, font_key, font, words):
+        '''
+        text node 하나의 단어들을 한꺼번에 받아서, 겹치는 단어는 한 번만 찾고 cache에 없는 단어만 잰다.
+        hits는 이 호출 전부터 cache에 있던 단어가 나온 횟수다. cache에 없던 단어는 이 안에서 여러 번 나와도 miss 한 번으로만 센다.
+        '''
+        widths = {}
+        missing = []
+        hits = 0
+        with self.lock:
+            for word in words:
+                if word in widths:
+                    if widths[word] is not None: hits += 1
+                    continue
+                key = (font_key, word)
+                width = self.widths.get(key)
+                if width is None:
+                    widths[word] = None
+                    missing.append(word)
+                else:
+                    self.widths.move_to_end(key)
+                    widths[word] = width
+                    hits += 1
+            self.hits += hits
+            self.misses += len(missing)
+        if missing:
+            with trace.span("measure", words=len(missing)):
+                for word in missing:
+                    widths[word] = font.measure(word)
+            with self.lock:
+                for word in missing:
+                    self.widths[(font_key, word)] = widths[word]
+                while len(self.widths) > self.max_size:
+                    self.widths.popitem(last=False)
+        return widths
+
+    def clear(self):
+        with self.lock:
+            self.widths.clear()
+            self.spaces.clear()
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hit_rate(), "size": len(self.widths)}
+
+    def __repr__(self):
+        return "MeasureCache(hits={}, misses={}, hit_rate={:.2%}, size={})".format(
+            self.hits, self.misses, self.hit_rate(), len(self.widths))
+
+WORD_WIDTHS = MeasureCache()
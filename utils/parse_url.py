@@ -8,7 +8,7 @@ def parse_url(url):
         host = url
         path = '/'
 
-    port = 80 if scheme == "http" else 443
+    port = 80 if scheme == "http" else 443 if scheme == "https" else None # file://에는 port가 없다.
 
     if ":" in host:
         host, port = host.split(":", 1)
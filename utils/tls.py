@@ -0,0 +1,27 @@
+import ssl
+import threading
+
+CONTEXT = None
+SESSIONS = {} # (host, port) -> ssl.SSLSession
+lock = threading.Lock()
+
+def get_context():
+    '''
+    ssl.create_default_context()는 매번 CA 인증서 묶음을 다시 읽어들이므로 process에서 한 번만 만들어 공유한다.
+    session도 같은 context에서 만든 것이어야 재사용할 수 있다.
+    '''
+    global CONTEXT
+    with lock:
+        if CONTEXT is None:
+            CONTEXT = ssl.create_default_context()
+        return CONTEXT
+
+def wrap(sock, host, port):
+    # 같은 host와 이전에 맺었던 session이 있으면 넘겨서 full handshake 대신 session resumption을 시도한다.
+    session = SESSIONS.get((host, port))
+    return get_context().wrap_socket(sock, server_hostname=host, session=session)
+
+def remember_session(sock, host, port):
+    # TLS 1.3에서는 session ticket이 handshake 이후에 오므로 응답을 읽기 시작한 뒤에 불러야 한다.
+    if isinstance(sock, ssl.SSLSocket) and sock.session is not None:
+        SESSIONS[(host, port)] = sock.session
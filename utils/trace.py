@@ -0,0 +1,95 @@
+'''
+페이지 load의 어느 단계에서 시간이 걸렸는지 timeline으로 보기 위한 tracing.
+결과는 Chrome trace-event json이라 chrome://tracing 이나 https://ui.perfetto.dev 에서 열어볼 수 있다.
+
+켜는 방법
+- 환경 변수: BROWSER_TRACE=trace.json python3 browser.py <url>
+- CLI: python3 browser.py --trace trace.json <url>
+- 코드: trace.enable("trace.json")
+process가 끝날 때 파일에 쓴다. (save()로 바로 쓸 수도 있다)
+
+꺼져 있을 때 span()은 미리 만들어 둔 아무것도 하지 않는 context manager를 돌려주고, counter()는 바로 돌아온다.
+counter에 넘길 값을 구하는 것 자체가 비싸면 호출하는 쪽에서 `if trace.ENABLED:`로 감싼다.
+'''
+import atexit
+import json
+import os
+import threading
+import time
+
+ENABLED = False
+OUTPUT = None
+EVENTS = [] # list.append는 GIL 아래에서 atomic이므로 여러 thread에서 lock 없이 쌓는다.
+EPOCH = time.perf_counter()
+
+def now_us():
+    return (time.perf_counter() - EPOCH) * 1e6
+
+def to_us(perf_counter_time):
+    # time.perf_counter() 값을 trace의 timestamp(μs)로
+    return (perf_counter_time - EPOCH) * 1e6
+
+class NullSpan:
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+    def set(self, **args): pass
+
+NULL_SPAN = NullSpan()
+
+class Span:
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def set(self, **args):
+        # span 안에서 알게 된 값(ex. 만든 node 수)을 덧붙인다.
+        self.args.update(args)
+
+    def __enter__(self):
+        self.start = now_us()
+        return self
+
+    def __exit__(self, *exc):
+        complete(self.name, self.start, now_us(), **self.args)
+        return False
+
+def span(name, **args):
+    '''
+    with trace.span("style"): ...
+    '''
+    if not ENABLED: return NULL_SPAN
+    return Span(name, args)
+
+def complete(name, start_us, end_us, **args):
+    # 이미 끝난 구간을 기록한다. 시작과 끝을 따로 재둔 경우(ex. streaming 응답)에 쓴다.
+    if not ENABLED: return
+    EVENTS.append({"name": name, "ph": "X", "ts": start_us, "dur": end_us - start_us,
+                   "pid": os.getpid(), "tid": threading.get_ident(), "args": args})
+
+def counter(name, **values):
+    '''
+    trace.counter("nodes", count=1234). timeline에 값의 변화가 그래프로 그려진다.
+    '''
+    if not ENABLED: return
+    EVENTS.append({"name": name, "ph": "C", "ts": now_us(),
+                   "pid": os.getpid(), "tid": threading.get_ident(), "args": values})
+
+def enable(path):
+    global ENABLED, OUTPUT
+    if not ENABLED:
+        atexit.register(save)
+    ENABLED = True
+    OUTPUT = path
+
+def save(path=None):
+    path = path or OUTPUT
+    if not path: return
+    threads = {event["tid"] for event in EVENTS}
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    metadata = [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid,
+                 "args": {"name": names.get(tid, "thread-{}".format(tid))}} for tid in threads]
+    with open(path, "w") as f:
+        json.dump({"traceEvents": metadata + EVENTS, "displayTimeUnit": "ms"}, f)
+
+if os.environ.get("BROWSER_TRACE"):
+    enable(os.environ["BROWSER_TRACE"])
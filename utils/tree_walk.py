@@ -0,0 +1,23 @@
+def preorder(root):
+    '''
+    root부터 depth-first pre-order로 node를 내놓는다. (부모가 항상 자식보다 먼저 나온다)
+    재귀 대신 명시적인 stack을 써서 수백 단계로 중첩된 문서에서도 RecursionError가 나지 않는다.
+    '''
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(node.children))
+
+def traverse(root):
+    '''
+    자식들을 방문하기 전에 (node, True)를, 자식들을 모두 방문한 뒤에 (node, False)를 내놓는다.
+    자식 목록은 (node, True)를 받은 쪽이 처리를 끝낸 다음에 읽으므로, 그 사이에 자식을 만들어 붙여도 된다. (layout tree를 만들면서 순회할 때)
+    '''
+    stack = [(root, True)]
+    while stack:
+        node, entering = stack.pop()
+        yield node, entering
+        if entering:
+            stack.append((node, False))
+            stack.extend((child, True) for child in reversed(node.children))
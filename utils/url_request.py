@@ -1,41 +1,179 @@
 import socket
-import ssl
+import time
+from collections import deque
 
 from utils.parse_url import parse_url
+from utils.dns_cache import RESOLVER
+from utils import tls
+from utils.connection_pool import POOL, Connection
+from utils.body_reader import read_body
+from utils.file_request import file_stream
+from utils.http_cache import CACHE, CacheEntry, is_storable, without_hop_by_hop
+from utils import trace
 
-def request(url: str):
-    scheme, host, port, path = parse_url(url)
+REQUEST_TIMINGS = deque(maxlen=256) # 최근 요청들의 단계별 소요 시간(ms). 재사용/resumption으로 아낀 시간을 비교해볼 수 있다.
+
+def connect(scheme, host, port, timing):
+    start = time.perf_counter()
+    address = RESOLVER.resolve(host, port)
+    timing["dns"] = elapsed_ms(start)
 
     s = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
 
-    s.connect((host, port))
+    start = time.perf_counter()
+    try:
+        s.connect(address)
+    except OSError:
+        s.close()
+        RESOLVER.forget(host, port)
+        raise
+    timing["connect"] = elapsed_ms(start)
 
     if scheme == "https":
-        ctx = ssl.create_default_context()
-        s = ctx.wrap_socket(s, server_hostname=host)
+        start = time.perf_counter()
+        s = tls.wrap(s, host, port)
+        timing["tls"] = elapsed_ms(start)
+        timing["tls_resumed"] = s.session_reused
+
+    return s
+
+def elapsed_ms(start):
+    return (time.perf_counter() - start) * 1000
+
+def request(url: str, keep_alive: bool = False, use_cache: bool = False):
+    headers, chunks = request_stream(url, keep_alive, use_cache)
+    return headers, "".join(chunks)
+
+def request_stream(url: str, keep_alive: bool = False, use_cache: bool = False):
+    '''
+    header까지만 읽고 body는 도착하는 대로 decode된 str 조각을 내놓는 generator로 돌려준다.
+    keep_alive=True면 HTTP/1.1로 요청하고, body를 끝까지 읽은 connection을 POOL에 반납해 같은 host로의 다음 요청에서 재사용한다.
+    file:// url은 socket 없이 파일을 mmap해서 읽는다. (cache도 거치지 않는다)
+    '''
+    scheme, host, port, path = parse_url(url)
+    if scheme == "file":
+        return file_stream(url, host, path)
+    if use_cache:
+        return cached_stream(url, keep_alive)
+    status, headers, chunks = open_response(url, keep_alive)
+    return headers, chunks
+
+def cached_stream(url, keep_alive):
+    '''
+    CACHE에 신선한 응답이 있으면 네트워크 없이 돌려주고, 신선하지 않지만 ETag/Last-Modified가 있으면 조건부 요청으로 재검증한다.
+    '''
+    entry = CACHE.get(url)
+    if entry and entry.is_fresh():
+        CACHE.record("hits")
+        trace.counter("http cache hits", count=CACHE.hits)
+        return entry.headers, iter([entry.body])
+
+    status, headers, chunks = open_response(url, keep_alive, entry.validators() if entry else {})
+    if status == "304":
+        "".join(chunks) # body는 없지만 connection을 pool에 돌려보내려면 끝까지 소비해야 한다.
+        CACHE.record("revalidations")
+        entry = entry.updated(headers)
+        CACHE.put(entry)
+        return entry.headers, iter([entry.body])
+
+    CACHE.record("misses")
+    return headers, store_while_streaming(url, headers, chunks, entry)
 
-    sent_bytes_size = s.send(
-        "GET {} HTTP/1.0\r\n".format(path).encode("utf8") + 
-        "Host: {}\r\n\r\n".format(host).encode("utf8"))
+def store_while_streaming(url, headers, chunks, entry):
+    # 받는 쪽에는 조각을 바로 넘기고, body를 끝까지 받은 뒤에 CACHE에 저장한다.
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    if is_storable(headers):
+        CACHE.put(CacheEntry(url, without_hop_by_hop(headers), "".join(parts), time.time()))
+    elif entry:
+        CACHE.delete(url)
+
+def open_response(url, keep_alive, extra_headers=None):
+    extra_headers = extra_headers or {}
+    scheme, host, port, path = parse_url(url)
+    key = (scheme, host, port)
+
+    if keep_alive:
+        conn = POOL.get(key)
+        if conn:
+            try:
+                timing = {"url": url, "reused": True, "start": time.perf_counter()}
+                response = fetch(conn, host, port, path, keep_alive, extra_headers, timing)
+                POOL.record(reused=True)
+                return response
+            except OSError:
+                # pool에서 노는 동안 서버가 먼저 닫아버린 connection. 새로 연결해서 한 번만 다시 시도한다.
+                pass
+        POOL.record(reused=False)
+
+    timing = {"url": url, "reused": False, "start": time.perf_counter()}
+    conn = Connection(key, connect(scheme, host, port, timing))
+    return fetch(conn, host, port, path, keep_alive, extra_headers, timing)
+
+def fetch(conn, host, port, path, keep_alive, extra_headers, timing):
+    try:
+        status, headers, reusable = send_and_receive_headers(conn, host, path, keep_alive, extra_headers)
+    except:
+        conn.close()
+        raise
+    timing["ttfb"] = elapsed_ms(timing["start"])
+    tls.remember_session(conn.sock, host, port)
+    has_body = status != "304" # 304 Not Modified에는 body가 없다.
+    return status, headers, stream_body(conn, headers, keep_alive and reusable, has_body, timing)
+
+def stream_body(conn, headers, reusable, has_body, timing):
+    try:
+        if has_body:
+            yield from read_body(conn.file, headers)
+    except:
+        # 중간에 끊겼거나 소비하는 쪽이 generator를 버린 경우. body가 덜 읽힌 connection은 재사용할 수 없다.
+        conn.close()
+        raise
+    if reusable:
+        POOL.put(conn)
+    else:
+        conn.close()
+    start = timing.pop("start")
+    timing["total"] = elapsed_ms(start)
+    REQUEST_TIMINGS.append(timing)
+    # 응답은 소비하는 쪽이 끝까지 읽어야 끝나므로 span 대신 시작과 끝을 재둔 구간으로 남긴다.
+    trace.complete("request", trace.to_us(start), trace.now_us(), **timing)
+
+def send_and_receive_headers(conn, host, path, keep_alive, extra_headers):
+    version = "HTTP/1.1" if keep_alive else "HTTP/1.0"
+    request_headers = "Host: {}\r\n".format(host)
+    request_headers += "Accept-Encoding: gzip, deflate\r\n"
+    if keep_alive:
+        request_headers += "Connection: keep-alive\r\n"
+    for header, value in extra_headers.items():
+        request_headers += "{}: {}\r\n".format(header, value)
+
+    sent_bytes_size = conn.sock.send(
+        "GET {} {}\r\n".format(path, version).encode("utf8") +
+        "{}\r\n".format(request_headers).encode("utf8"))
     print("sent_bytes_size", sent_bytes_size)
 
-    response = s.makefile("r", encoding="utf8", newline="\r\n")
-    statusline = response.readline() # 헤더 한 줄 읽어와야 함. 다른 header들과 포맷이 다르다. 'HTTP/1.0 200 OK\r\n'
-    version, status, explanation = statusline.split(" ", 2) 
-    assert status == "200", "{}: {}".format(status, explanation)
+    response = conn.file
+    statusline = response.readline().decode("utf8") # 헤더 한 줄 읽어와야 함. 다른 header들과 포맷이 다르다. 'HTTP/1.0 200 OK\r\n'
+    if not statusline:
+        raise ConnectionResetError("connection closed before status line")
+    version, status, explanation = statusline.split(" ", 2)
+    # 304는 조건부 요청(extra_headers에 If-None-Match 등을 실어 보낸 경우)에만 정상 응답이다.
+    assert status == "200" or (status == "304" and extra_headers), "{}: {}".format(status, explanation)
 
     headers = {}
     while True:
-        line = response.readline() # 'Accept-Ranges: bytes\r\n' 꼴의 header들을 한 줄씩 읽어나감.
+        line = response.readline().decode("utf8") # 'Accept-Ranges: bytes\r\n' 꼴의 header들을 한 줄씩 읽어나감.
         if line == "\r\n": break # header의 끝은 항상 공백(\r\n)으로 끝나기 때문에.
         header, value = line.split(":", 1)
         headers[header.lower()] = value.strip()
 
-    assert "transfer-encoding" not in headers # allows the data to be “chunked”
-    assert "content-encoding" not in headers # lets the server compress web pages before sending them
-
-    body = response.read() # 앞서 header 다 읽었고, \r\n 공백 하단은 body겠지?
-
-    s.close()
+    # keep-alive에서는 서버가 socket을 닫지 않으므로 EOF까지 읽으면 안 되고 body의 끝을 알 수 있어야 한다.
+    reusable = version == "HTTP/1.1" \
+        and headers.get("connection", "").lower() != "close" \
+        and (status == "304" or "content-length" in headers
+             or headers.get("transfer-encoding", "").lower() == "chunked")
 
-    return headers, body
\ No newline at end of file
+    return status, headers, reusable